@@ -0,0 +1,88 @@
+"""Cold start benchmark for the TODO app.
+
+Launches todo_app.py in a fresh process with a seeded tasks.json, lets it
+exit once the window is drawn and every task is loaded, and collects the
+startup report it writes (import, window, ui, first_paint, load, ready).
+Needs a display. Results are written as JSON so runs can be compared:
+
+    python benchmarks/bench_startup.py --tasks 0,10000 --output startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+
+from bench_tasks import generate_tasks
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_engine import write_json_atomic  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "todo_app.py")
+PHASES = ["import", "window", "ui", "first_paint", "load", "ready"]
+
+
+def start_app(work_dir, timeout):
+    """Run the app once in work_dir and return its startup timings"""
+    report_file = os.path.join(work_dir, "startup.json")
+    if os.path.exists(report_file):
+        os.remove(report_file)
+    env = dict(os.environ, TODO_STARTUP_REPORT=report_file, TODO_EXIT_AFTER_STARTUP="1")
+    subprocess.run([sys.executable, APP], cwd=work_dir, env=env, timeout=timeout,
+                   stdout=subprocess.DEVNULL, check=True)
+    with open(report_file) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", default="0,1000,10000",
+                        help="comma separated task counts to start with")
+    parser.add_argument("--repeat", type=int, default=5, help="starts per task count, the fastest counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for one start")
+    parser.add_argument("--output", default="startup_results.json",
+                        help="where to write the JSON results, - for stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    for count in [int(count) for count in args.tasks.split(",")]:
+        with tempfile.TemporaryDirectory(prefix="todo-startup-") as work_dir:
+            write_json_atomic(os.path.join(work_dir, "tasks.json"), generate_tasks(count, args.seed))
+            runs = [start_app(work_dir, args.timeout) for _ in range(args.repeat)]
+
+        result = {"tasks": count, "repeat": len(runs)}
+        for phase in PHASES:
+            timings = [run[phase] for run in runs]
+            result[f"{phase}_min_seconds"] = min(timings)
+            result[f"{phase}_mean_seconds"] = sum(timings) / len(timings)
+        results.append(result)
+        print(
+            f"{count:>8} tasks  first paint {result['first_paint_min_seconds']:.3f}s  "
+            f"ready {result['ready_min_seconds']:.3f}s",
+            file=sys.stderr
+        )
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
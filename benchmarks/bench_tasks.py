@@ -0,0 +1,254 @@
+"""Benchmarks for the task engine at 1k to 1M tasks.
+
+Generates a seeded, realistic set of tasks for each size, then times
+loading, saving, searches typed a key at a time, calendar day lookups,
+bursts of changes, archiving and filter switches with the archive paged
+in, on every storage backend. Results are written as JSON so runs
+can be compared:
+
+    python benchmarks/bench_tasks.py
+    python benchmarks/bench_tasks.py --sizes 1000,10000 --storage json --output before.json
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_engine import TaskEngine, write_json_atomic  # noqa: E402
+
+SIZES = [1000, 10000, 100000, 1000000]
+STORAGE_MODES = ["json", "journal", "sqlite"]
+FILTERS = ["All", "Active", "Completed"]
+DAY_LOOKUPS = 1000
+MUTATION_BURST = 1000
+SEARCH_WORDS = 5  # Words typed out, one key at a time, per filter
+ARCHIVE_TODAY = date(2025, 1, 1)  # Archives the completed tasks of the first years
+ARCHIVE_AFTER_DAYS = 30
+
+WORDS = (
+    "buy call email fix review write plan book pay send check clean read "
+    "update prepare finish schedule order return renew backup test deploy "
+    "milk report invoice dentist meeting slides taxes garden car laptop "
+    "groceries tickets passport budget notes draft release server tomorrow"
+).split()
+
+
+def generate_tasks(count, seed=42, start=datetime(2022, 1, 1)):
+    """Seeded task list in the tasks.json layout.
+
+    About 40% of the tasks are completed, 70% have a due date spread over
+    five years and one in ten has a long, paragraph sized text. Completed
+    tasks were finished on their due date, or the day they were made.
+    """
+    rng = random.Random(seed)
+    span = 5 * 365 * 24 * 3600
+    base_id = int(start.strftime("%Y%m%d%H%M%S%f"))
+    tasks = []
+    for i in range(count):
+        created = start + timedelta(seconds=rng.randrange(span))
+        if rng.random() < 0.1:
+            length = rng.randint(40, 120)
+        else:
+            length = rng.randint(2, 8)
+        due = None
+        if rng.random() < 0.7:
+            # Most due dates are days or weeks after the task was made
+            due = created + timedelta(days=rng.randint(0, 60), hours=rng.randint(0, 23))
+        task = {
+            "id": str(base_id + i),
+            "text": " ".join(rng.choice(WORDS) for _ in range(length)).capitalize(),
+            "completed": rng.random() < 0.4,
+            "date": created.isoformat(),
+            "due_date": due.isoformat() if due else None,
+        }
+        if task["completed"]:
+            task["completed_at"] = (due or created).isoformat()
+        tasks.append(task)
+    return tasks
+
+
+def timed(func, repeat):
+    """Run func repeat times, returning the timings and the last result"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def record(results, size, storage, scenario, timings, ops=1):
+    best = min(timings)
+    results.append({
+        "size": size,
+        "storage": storage,
+        "scenario": scenario,
+        "ops": ops,
+        "repeat": len(timings),
+        "min_seconds": best,
+        "mean_seconds": sum(timings) / len(timings),
+        "per_op_seconds": best / ops,
+    })
+    # Progress goes to stderr so --output - leaves clean JSON on stdout
+    print(f"{size:>8} {storage:<8} {scenario:<12} {best:10.4f}s  ({ops} ops)", file=sys.stderr)
+
+
+def open_engine(data_file, storage):
+    engine = TaskEngine(data_file, storage, background=False)
+    engine.load()
+    return engine
+
+
+def mutation_burst(engine, rng, count):
+    """Adds, edits, toggles and deletes, like a busy editing session"""
+    ids = [task.id for task in rng.sample(engine.tasks, min(count, len(engine)))]
+    for i in range(count):
+        kind = i % 4
+        if kind == 0 or not ids:
+            engine.add_task(f"Benchmark task {i}", due=datetime(2024, 6, 1 + i % 28))
+        elif kind == 1:
+            engine.toggle_task(ids.pop(), True)
+        elif kind == 2:
+            engine.update_task(ids.pop(), {"text": f"Edited task {i}"})
+        else:
+            engine.delete_task(ids.pop())
+    engine.flush()
+
+
+def typed_queries(rng, count):
+    """Queries as the search box sees them while words are typed out"""
+    queries = []
+    for _ in range(count):
+        word = rng.choice(WORDS)
+        queries.extend(word[:end] for end in range(1, len(word) + 1))
+        queries.append(word + " ")
+    return queries
+
+
+def page_in_archive(engine):
+    """Page every archive segment into the Completed filter, as a new session would"""
+    engine.archive.segments = {}
+    engine.archive.paged = []
+    while engine.page_older_completed():
+        pass
+
+
+def bench_storage(results, tasks, size, storage, repeat, seed, work_dir):
+    data_file = os.path.join(work_dir, f"tasks_{size}_{storage}.json")
+    write_json_atomic(data_file, tasks)
+    # The first open of a SQLite backend imports tasks.json, leave it out
+    TaskEngine(data_file, storage, background=False).close()
+
+    def load():
+        engine = open_engine(data_file, storage)
+        engine.close()
+        return engine
+
+    timings, _ = timed(load, repeat)
+    record(results, size, storage, "load", timings)
+
+    engine = open_engine(data_file, storage)
+    try:
+        timings, _ = timed(lambda: engine.storage.write_snapshot(engine.snapshot()), repeat)
+        record(results, size, storage, "save", timings)
+
+        rng = random.Random(seed)
+
+        # The index is built once, by the first search
+        timings, _ = timed(engine.build_search_index, 1)
+        record(results, size, storage, "search_index", timings)
+
+        queries = typed_queries(rng, SEARCH_WORDS)
+
+        def type_searches():
+            for filter_type in FILTERS:
+                for query in queries:
+                    engine.search(query, filter_type)
+
+        timings, _ = timed(type_searches, repeat)
+        record(results, size, storage, "search", timings, len(FILTERS) * len(queries))
+
+        days = [task.due_day for task in engine.tasks if task.due is not None]
+        days = [rng.choice(days) for _ in range(DAY_LOOKUPS)] if days else []
+
+        def calendar_lookups():
+            for day in days:
+                engine.tasks_on_day(day)
+                engine.month_summary(day.year, day.month)
+
+        timings, _ = timed(calendar_lookups, repeat)
+        record(results, size, storage, "calendar", timings, max(len(days), 1))
+
+        burst = min(MUTATION_BURST, size)
+        timings, _ = timed(lambda: mutation_burst(engine, rng, burst), repeat)
+        record(results, size, storage, "mutations", timings, burst)
+
+        # Archiving changes the task list, so it comes last and runs once
+        timings, archived = timed(lambda: engine.archive_completed(ARCHIVE_AFTER_DAYS, ARCHIVE_TODAY), 1)
+        record(results, size, storage, "archive", timings, max(len(archived), 1))
+        engine.flush()
+
+        timings, _ = timed(lambda: page_in_archive(engine), repeat)
+        record(results, size, storage, "archive_page", timings, max(len(archived), 1))
+
+        def switch_filters():
+            for filter_type in FILTERS:
+                engine.filtered(filter_type)
+
+        # With the archive paged in, Completed is the working set's
+        # completed tasks plus every archived one not back in the list
+        timings, _ = timed(switch_filters, repeat)
+        record(results, size, storage, "filter", timings, len(FILTERS))
+    finally:
+        engine.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="comma separated task counts")
+    parser.add_argument("--storage", default=",".join(STORAGE_MODES),
+                        help="comma separated storage modes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the fastest counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="where to write the JSON results, - for stdout")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    storages = args.storage.split(",")
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="todo-bench-") as work_dir:
+        for size in sizes:
+            tasks = generate_tasks(size, args.seed)
+            for storage in storages:
+                bench_storage(results, tasks, size, storage, args.repeat, args.seed, work_dir)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
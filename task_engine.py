@@ -0,0 +1,2634 @@
+"""Headless task engine: the task model, indexes, storage and persistence.
+
+Nothing here depends on Tk, so the engine can run in scripts, benchmarks
+and batch jobs as well as behind the TodoApp window.
+"""
+import os
+import bisect
+import json
+import calendar
+import collections
+import functools
+import heapq
+import queue
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    # Optional; without it the storage files are checked on every poll
+    Observer = None
+# sqlite3 is imported by SqliteStorage, as only the "sqlite" storage mode
+# needs it, and asyncio by AsyncRunner once the first job is submitted;
+# neither should cost anything at startup
+
+# Storage: "journal" appends each change to a log next to the tasks file and
+# periodically compacts it, "json" rewrites the whole file on every change and
+# "sqlite" keeps the tasks in an indexed SQLite database (tasks.db)
+STORAGE_MODE = "journal"
+JOURNAL_COMPACT_BYTES = 256 * 1024
+PERSIST_COALESCE_SECONDS = 0.2  # Changes this close together share one write
+
+LOAD_READ_BYTES = 64 * 1024  # Read size when streaming a tasks file
+# While SQLite storage is still loading, a filter shows its first this many
+# tasks straight from the database
+LOAD_PAGE_SIZE = 500
+
+# Set to a number of days to move tasks completed longer ago than that out
+# of the working set into archive segments (see TaskArchive). Off (None) by
+# default, as archived tasks leave tasks.json and the Completed list
+ARCHIVE_AFTER_DAYS = None
+
+# Undo history is bounded by its number of change records (one per task
+# changed), so a long session or a huge bulk delete cannot grow it without end
+UNDO_MAX_RECORDS = 100_000
+
+# Display format of task dates, and how many parsed and formatted dates to keep
+DATE_FORMAT = "%b %d, %Y"
+DATE_CACHE_SIZE = 4096
+
+
+def parse_iso(value):
+    """Parse an ISO date string, returning None for missing or bad values"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_day(day, fmt):
+    """strftime for a calendar day, memoized by day and format.
+
+    fmt must only use date fields. The result depends on the locale, so
+    call invalidate_date_cache after changing it.
+    """
+    return day.strftime(fmt)
+
+
+def invalidate_date_cache():
+    format_day.cache_clear()
+
+
+def local_day(moment):
+    """Return the local calendar day of a datetime, or None"""
+    if moment is None:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone()
+    return moment.date()
+
+
+def due_day(due_date):
+    """Return the local calendar day of an ISO due date string, or None"""
+    return local_day(parse_iso(due_date))
+
+
+def completed_day(task):
+    """Local day a completed task was finished on.
+
+    None for tasks completed before completion times were kept, as their
+    dates do not tell when they were finished.
+    """
+    return local_day(parse_iso((task.extra or {}).get("completed_at")))
+
+
+class Task:
+    """A task, kept in a compact slotted object rather than a dict.
+
+    Ids are integers and the created and due dates are parsed into
+    datetimes once, when the task is read. to_dict and from_dict convert
+    to and from the tasks.json layout, where ids are strings and dates ISO
+    strings; keys without a slot of their own are kept in extra.
+    """
+
+    __slots__ = ("id", "text", "completed", "created", "due", "extra")
+
+    def __init__(self, id, text, completed=False, created=None, due=None, extra=None):
+        self.id = id
+        self.text = text
+        self.completed = completed
+        self.created = created
+        self.due = due
+        self.extra = extra
+
+    @property
+    def due_day(self):
+        return local_day(self.due)
+
+    @staticmethod
+    def parse_id(value):
+        try:
+            task_id = int(value)
+        except (TypeError, ValueError):
+            # Hand edited files may have other ids, keep them as they are
+            return value
+        # Ids like "007" or " 12 " would be saved back as different ids
+        return task_id if str(task_id) == str(value) else value
+
+    @classmethod
+    def from_dict(cls, data):
+        task = cls(cls.parse_id(data.get("id")), data.get("text", ""), bool(data.get("completed")))
+        task.update_fields(data)
+        return task
+
+    def update_fields(self, fields):
+        """Apply changes given in the tasks.json layout"""
+        for key, value in fields.items():
+            if key == "id":
+                continue
+            elif key == "text":
+                self.text = value
+            elif key == "completed":
+                self.completed = bool(value)
+            elif key in ("date", "due_date"):
+                moment = parse_iso(value)
+                if key == "date":
+                    self.created = moment
+                else:
+                    self.due = moment
+                if moment is None and value:
+                    # Not a date we can read, keep the original text
+                    self.set_extra(key, value)
+                elif self.extra:
+                    self.extra.pop(key, None)
+            else:
+                self.set_extra(key, value)
+
+    def set_extra(self, key, value):
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def to_dict(self):
+        data = {
+            "id": str(self.id),
+            "text": self.text,
+            "completed": self.completed,
+            "date": self.created.isoformat() if self.created else None,
+            "due_date": self.due.isoformat() if self.due else None,
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+# Recurring tasks
+
+REPEAT_UNITS = ("day", "week", "month")
+
+
+def repeat_rule(task):
+    """A recurring task's rule as (unit, interval, until), or None.
+
+    A task repeats when its extra holds "repeat": {"every": "week",
+    "interval": 2, "until": "2025-12-31"}, with interval and until
+    optional. Its due date is the first occurrence. Completed occurrences
+    are kept as "repeat_done_through", the ISO day up to which every
+    occurrence is done, plus "repeat_done", the ISO days of any done after
+    it; so a series is stored once, in the same few bytes however many
+    times it comes round.
+    """
+    rule = task.extra.get("repeat") if task.extra else None
+    if not isinstance(rule, dict) or task.due is None:
+        return None
+    unit = rule.get("every")
+    interval = rule.get("interval", 1)
+    if unit not in REPEAT_UNITS or not isinstance(interval, int) or interval < 1:
+        # Hand edited into something we cannot follow, show it as a plain task
+        return None
+    until = rule.get("until")
+    return unit, interval, due_day(until) if until else None
+
+
+def add_months(moment, months):
+    """The same day months later, or the month's last day if it is shorter"""
+    month = moment.month - 1 + months
+    year = moment.year + month // 12
+    month = month % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrences(task, start=None, end=None):
+    """Yield (day, due) for the occurrences of a recurring task.
+
+    Only the occurrences due from day start to day end (both included,
+    None for open ended) are made, starting straight at the first one in
+    range rather than counting up from the task's due date.
+    """
+    rule = repeat_rule(task)
+    if rule is None:
+        return
+    unit, interval, until = rule
+    first = task.due_day
+    if until is not None and (end is None or until < end):
+        end = until
+
+    k = 0
+    if start is not None and start > first:
+        if unit == "month":
+            k = ((start.year - first.year) * 12 + start.month - first.month) // interval
+        else:
+            step = interval * (7 if unit == "week" else 1)
+            k = -(-(start - first).days // step)  # Rounded up
+    while True:
+        if unit == "month":
+            due = add_months(task.due, k * interval)
+        else:
+            due = task.due + timedelta(days=k * interval * (7 if unit == "week" else 1))
+        day = local_day(due)
+        if end is not None and day > end:
+            return
+        if start is None or day >= start:
+            yield day, due
+        k += 1
+
+
+def done_through(task):
+    """The day up to which every occurrence of a recurring task is done, or None"""
+    value = (task.extra or {}).get("repeat_done_through")
+    try:
+        return date.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def done_days(task):
+    """ISO days of the completed occurrences after done_through, in order"""
+    return (task.extra or {}).get("repeat_done") or []
+
+
+def occurrence_done(day, through, done):
+    """Whether the occurrence on day is completed, given done_through and a set of done_days"""
+    return (through is not None and day <= through) or day.isoformat() in done
+
+
+def last_done(task):
+    """The day of a recurring task's last completed occurrence, or None"""
+    through = done_through(task)
+    done = done_days(task)
+    if done:
+        last = date.fromisoformat(done[-1])
+        if through is None or last > through:
+            return last
+    return through
+
+
+def next_occurrence(task):
+    """The first occurrence after the last completed one, as (day, due) or None"""
+    last = last_done(task)
+    start = last + timedelta(days=1) if last else None
+    return next(occurrences(task, start), None)
+
+
+def next_due(task, after=None):
+    """When a task is next due: its due date, or for a recurring task its next occurrence.
+
+    With after, a timestamp, a recurring task's first occurrence due later
+    than that is returned instead, skipping the ones that went by.
+    """
+    if task.extra and "repeat" in task.extra and repeat_rule(task) is not None:
+        if after is None:
+            upcoming = next_occurrence(task)
+            return upcoming[1] if upcoming else None
+        last = last_done(task)
+        start = datetime.fromtimestamp(after).date()
+        if last:
+            start = max(start, last + timedelta(days=1))
+        for day, due in occurrences(task, start):
+            if due.timestamp() > after:
+                return due
+        return None
+    return task.due
+
+
+def occurrence_fields(task, completed):
+    """The field changes that complete or reopen a recurring task's next occurrence.
+
+    Completing moves repeat_done_through up to the occurrence, folding in
+    the repeat_done days before it, and completes the whole series once no
+    occurrence is left. Reopening takes back the last completed occurrence.
+    The changes name one day, whatever the length of the series.
+    """
+    fields = {}
+    if completed:
+        upcoming = next_occurrence(task)
+        if upcoming is not None:
+            fields["repeat_done_through"] = upcoming[0].isoformat()
+            if done_days(task):
+                # Every day in repeat_done comes before the next occurrence
+                fields["repeat_done"] = None
+        ended = upcoming is None or next(occurrences(task, upcoming[0] + timedelta(days=1)), None) is None
+        fields["completed"] = ended
+        fields["completed_at"] = datetime.now().isoformat() if ended else None
+        return fields
+
+    done = done_days(task)
+    through = done_through(task)
+    if done and (through is None or date.fromisoformat(done[-1]) > through):
+        fields["repeat_done"] = done[:-1] or None
+    elif through is not None:
+        # The occurrence before it; none is more than 31 days per interval back
+        window = timedelta(days=31 * repeat_rule(task)[1])
+        previous = None
+        for day, _ in occurrences(task, through - window, through - timedelta(days=1)):
+            previous = day
+        fields["repeat_done_through"] = previous.isoformat() if previous else None
+    fields["completed"] = False
+    fields["completed_at"] = None
+    return fields
+
+
+class Occurrence:
+    """One occurrence of a recurring task, as shown on a calendar day.
+
+    Made on the fly by TaskStore.tasks_on_day and never stored; id is the
+    series' id and series the recurring Task itself.
+    """
+
+    __slots__ = ("id", "text", "completed", "created", "due", "extra", "series")
+
+    def __init__(self, series, due, completed):
+        self.id = series.id
+        self.text = series.text
+        self.completed = completed
+        self.created = series.created
+        self.due = due
+        self.extra = series.extra
+        self.series = series
+
+    @property
+    def due_day(self):
+        return local_day(self.due)
+
+
+WORD_RE = re.compile(r"\w+")
+WORD_END_RE = re.compile(r"\w$")
+
+
+def tokenize(text):
+    """Lowercase words of a text, as used by the search index"""
+    return WORD_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """Inverted index from words to the ids of the tasks that contain them.
+
+    A query matches the tasks containing all of its words. Unless the query
+    ends in a space or punctuation, its last word only has to start a word
+    of the task, so results follow along while it is typed. A query that
+    extends the previous one can only match fewer tasks, so it is answered
+    by narrowing the previous results rather than from the index.
+    """
+
+    def __init__(self):
+        self.postings = {}  # word -> set of task ids
+        self.words = {}  # task id -> frozenset of the task's words
+        self.vocabulary = None  # Sorted words for prefix lookups, built on demand
+        self.last_query = None
+        self.last_ids = None
+
+    def add(self, task):
+        words = frozenset(tokenize(task.text))
+        self.words[task.id] = words
+        for word in words:
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                self.vocabulary = None
+            ids.add(task.id)
+        # Results of the last query may now be missing this task
+        self.last_query = None
+
+    def remove(self, task):
+        for word in self.words.pop(task.id, ()):
+            ids = self.postings.get(word)
+            if ids is not None:
+                ids.discard(task.id)
+                if not ids:
+                    del self.postings[word]
+                    self.vocabulary = None
+        self.last_query = None
+
+    def search(self, query):
+        """Ids of the tasks matching a query, or None if it has no words"""
+        query = query.lower()
+        words = tokenize(query)
+        if not words:
+            return None
+        prefix = words.pop() if WORD_END_RE.search(query) else None
+
+        # Start from the previous results when this query extends that one
+        ids = None
+        if self.last_query is not None and query.startswith(self.last_query):
+            ids = self.last_ids
+
+        # Intersect the rarest words first to keep the sets small
+        for word in sorted(words, key=lambda word: len(self.postings.get(word, ()))):
+            postings = self.postings.get(word, set())
+            ids = set(postings) if ids is None else ids & postings
+            if not ids:
+                break
+        if prefix is not None and (ids is None or ids):
+            matching = self.prefix_ids(prefix)
+            ids = matching if ids is None else ids & matching
+
+        self.last_query = query
+        self.last_ids = ids
+        return ids
+
+    def prefix_ids(self, prefix):
+        """Ids of the tasks with a word starting with prefix"""
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        ids = set()
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+            ids.update(self.postings[self.vocabulary[i]])
+            i += 1
+        return ids
+
+
+class ReminderQueue:
+    """Due times of the active tasks, earliest first, for due reminders.
+
+    A min-heap of (due timestamp, n, task id) plus scheduled, the due time
+    each task is currently scheduled for. Rescheduling or cancelling a task
+    only changes scheduled; the heap entries left behind are skipped once
+    they reach the top (lazy deletion). A change costs O(log n) and the
+    earliest due time is always at the top, so one timer covers every task.
+
+    Tasks due before since, e.g. overdue when the tasks are loaded, are not
+    scheduled; pop_due moves since forward as reminders fire.
+    """
+
+    def __init__(self, since=None):
+        self.heap = []
+        self.scheduled = {}
+        self.since = time.time() if since is None else since
+        self.counter = 0  # Keeps ids from being compared on equal times
+
+    def __len__(self):
+        return len(self.scheduled)
+
+    def schedule(self, task):
+        """Schedule an added or changed task, if it is active and due later"""
+        due = None if task.completed else next_due(task, self.since)
+        if due is None:
+            self.cancel(task.id)
+            return
+        due = due.timestamp()
+        if due < self.since:
+            self.cancel(task.id)
+            return
+        if self.scheduled.get(task.id) == due:
+            return
+        self.scheduled[task.id] = due
+        self.counter += 1
+        heapq.heappush(self.heap, (due, self.counter, task.id))
+        if len(self.heap) > 2 * len(self.scheduled) + 64:
+            self.compact()
+
+    def cancel(self, task_id):
+        self.scheduled.pop(task_id, None)
+
+    def compact(self):
+        """Drop the stale entries once they make up half the heap"""
+        self.heap = [entry for entry in self.heap if self.scheduled.get(entry[2]) == entry[0]]
+        heapq.heapify(self.heap)
+
+    def next_due(self):
+        """The earliest scheduled due time as a timestamp, or None"""
+        heap = self.heap
+        while heap and self.scheduled.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now=None):
+        """Ids of the tasks that came due by now, taken off the schedule"""
+        now = time.time() if now is None else now
+        due_ids = []
+        while True:
+            due = self.next_due()
+            if due is None or due > now:
+                break
+            task_id = heapq.heappop(self.heap)[2]
+            del self.scheduled[task_id]
+            due_ids.append(task_id)
+        self.since = max(self.since, now)
+        return due_ids
+
+
+class TaskPartition:
+    """The tasks shown by one filter, kept in list order.
+
+    seqs holds the position stamp of each task in tasks, so a task can be
+    placed or found by binary search rather than by scanning the list.
+    """
+
+    __slots__ = ("seqs", "tasks")
+
+    def __init__(self):
+        self.seqs = []
+        self.tasks = []
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def insert(self, seq, task):
+        i = bisect.bisect_left(self.seqs, seq)
+        self.seqs.insert(i, seq)
+        self.tasks.insert(i, task)
+
+    def remove(self, seq):
+        i = bisect.bisect_left(self.seqs, seq)
+        if i < len(self.seqs) and self.seqs[i] == seq:
+            del self.seqs[i]
+            del self.tasks[i]
+
+
+class TaskStore:
+    """The task list together with the indexes kept over it.
+
+    The store holds Task objects. by_id maps task ids to tasks, by_day
+    maps a local calendar day to the ids of the tasks due that day, and
+    day_stats and month_stats hold the total and completed counts of the
+    tasks due on each day and in each (year, month).
+
+    The Active and Completed filters are kept as TaskPartitions, ordered by
+    seqs, the position stamp each task gets when added. Filtering and
+    counting are O(1); toggling a task moves it between the partitions.
+
+    The SearchIndex over task text is built by build_search_index, in
+    slices or by the first search, and kept up to date from then on.
+    reminders, a ReminderQueue, holds the due times of the active tasks.
+
+    Recurring tasks (see repeat_rule) are kept in recurring instead of the
+    due day indexes; their occurrences are only worked out for the days
+    and months being looked up.
+
+    All changes to the list go through the store so the indexes always
+    match it and lookups never have to scan the list.
+    """
+
+    def __init__(self):
+        self.reset([])
+
+    def reset(self, tasks):
+        """Replace the contents of the store, e.g. after loading from disk"""
+        self.tasks = []
+        self.by_id = {}
+        self.by_day = {}
+        self.day_stats = {}
+        self.month_stats = {}
+        self.seqs = {}
+        self.next_seq = 0
+        self.active = TaskPartition()
+        self.completed = TaskPartition()
+        self.search_index = None
+        self.search_pending = []  # Tasks still to be indexed for search
+        self.search_pending_pos = 0
+        self.reminders = ReminderQueue()
+        self.recurring = {}
+        self.renamed = 0  # Tasks given new ids, not yet saved with them
+        self.extend(tasks)
+
+    def extend(self, tasks):
+        """Add tasks read from storage, given in the tasks.json layout"""
+        for data in tasks:
+            task = Task.from_dict(data)
+            # Older versions could give several tasks the same id
+            if task.id in self.by_id:
+                task.id = self.new_id()
+                self.renamed += 1
+            self.add(task)
+
+    def get(self, task_id):
+        return self.by_id.get(task_id)
+
+    def __contains__(self, task_id):
+        return task_id in self.by_id
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def new_id(self, now=None, taken=()):
+        """Return a timestamp based id that is not used by any task, nor in taken"""
+        task_id = int((now or datetime.now()).strftime("%Y%m%d%H%M%S%f"))
+        while task_id in self.by_id or task_id in taken:
+            task_id += 1
+        return task_id
+
+    def add(self, task, seq=None):
+        """Add a task at the end of the list, or back at its old position seq"""
+        if seq is None or seq >= self.next_seq:
+            self.tasks.append(task)
+        else:
+            self.tasks.insert(self._position(seq), task)
+        self._register(task, seq)
+        self._partition(task).insert(self.seqs[task.id], task)
+
+    def put_back(self, pairs):
+        """Add removed tasks back at their old positions, given as (seq, task) pairs"""
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        if len(pairs) < 64:
+            for seq, task in pairs:
+                self.add(task, seq)
+            return
+        # Each insert shifts the list, so merge many tasks back in one pass
+        for seq, task in pairs:
+            self._register(task, seq)
+        seqs = self.seqs
+        returning = [task for seq, task in pairs]
+        self.tasks = list(heapq.merge(self.tasks, returning, key=lambda task: seqs[task.id]))
+        self._rebuild_partitions()
+
+    def _register(self, task, seq=None):
+        if seq is None:
+            seq = self.next_seq
+        self.by_id[task.id] = task
+        self.seqs[task.id] = seq
+        self.next_seq = max(self.next_seq, seq + 1)
+        self._index_due(task)
+        if self.search_index is not None:
+            self.search_index.add(task)
+
+    def _position(self, seq):
+        """Where a task with position stamp seq belongs in the list"""
+        lo, hi = 0, len(self.tasks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.seqs[self.tasks[mid].id] < seq:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def update(self, task_id, fields):
+        """Apply field changes in the tasks.json layout to a task and return it"""
+        return self._change(task_id, lambda task: task.update_fields(fields), "text" in fields)
+
+    def replace(self, task_id, data):
+        """Give a task the fields of data, in the tasks.json layout, and return it.
+
+        Unlike update, keys that data lacks are dropped from the task.
+        """
+        fresh = Task.from_dict(data)
+
+        def apply(task):
+            task.text = fresh.text
+            task.completed = fresh.completed
+            task.created = fresh.created
+            task.due = fresh.due
+            task.extra = fresh.extra
+
+        return self._change(task_id, apply, True)
+
+    def _change(self, task_id, apply, text_changed):
+        task = self.by_id.get(task_id)
+        if task is not None:
+            was_completed = task.completed
+            self._unindex_due(task)
+            if text_changed and self.search_index is not None:
+                self.search_index.remove(task)
+            apply(task)
+            self._index_due(task)
+            if task.completed != was_completed:
+                seq = self.seqs[task_id]
+                (self.completed if was_completed else self.active).remove(seq)
+                self._partition(task).insert(seq, task)
+            if text_changed and self.search_index is not None:
+                self.search_index.add(task)
+        return task
+
+    def remove(self, task_id):
+        """Remove a task by id and return it, or None if there is no such task"""
+        task = self.by_id.pop(task_id, None)
+        if task is not None:
+            self.tasks.remove(task)
+            self._partition(task).remove(self.seqs.pop(task_id))
+            self._unindex_due(task)
+            if self.search_index is not None:
+                self.search_index.remove(task)
+        return task
+
+    def remove_where(self, predicate):
+        """Remove every task matching predicate and return the removed tasks"""
+        removed = [task for task in self.tasks if predicate(task)]
+        if removed:
+            self.tasks = [task for task in self.tasks if not predicate(task)]
+            for task in removed:
+                del self.by_id[task.id]
+                del self.seqs[task.id]
+                self._unindex_due(task)
+                if self.search_index is not None:
+                    self.search_index.remove(task)
+            # Cheaper to rebuild the partitions than to take out many tasks
+            self._rebuild_partitions()
+        return removed
+
+    def _rebuild_partitions(self):
+        self.active = TaskPartition()
+        self.completed = TaskPartition()
+        for task in self.tasks:
+            # The list is in seq order, so appending keeps the partitions sorted
+            partition = self._partition(task)
+            partition.seqs.append(self.seqs[task.id])
+            partition.tasks.append(task)
+
+    def filtered(self, filter_type="All"):
+        """Tasks shown by one of the task view's filters, in list order.
+
+        The list is the store's own, callers must not change it.
+        """
+        if filter_type == "Active":
+            return self.active.tasks
+        elif filter_type == "Completed":
+            return self.completed.tasks
+        return self.tasks
+
+    def build_search_index(self, seconds=None):
+        """Index the task text for search, for about the given time.
+
+        Returns True once every task is indexed; without seconds the index
+        is finished in one go. Tasks changed while the index is being built
+        are indexed as they change.
+        """
+        if self.search_index is None:
+            self.search_index = SearchIndex()
+            self.search_pending = list(self.tasks)
+            self.search_pending_pos = 0
+
+        index = self.search_index
+        pending = self.search_pending
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        pos = self.search_pending_pos
+        while pos < len(pending):
+            task = pending[pos]
+            pos += 1
+            # Skip tasks deleted or already indexed by an edit since
+            if self.by_id.get(task.id) is task and task.id not in index.words:
+                index.add(task)
+            if deadline is not None and pos % 256 == 0 and time.perf_counter() >= deadline:
+                break
+        self.search_pending_pos = pos
+
+        if pos < len(pending):
+            return False
+        self.search_pending = []
+        return True
+
+    def search(self, query, filter_type="All"):
+        """Tasks in a filter whose text matches a search query, in list order"""
+        self.build_search_index()
+        ids = self.search_index.search(query)
+        if ids is None:
+            return self.filtered(filter_type)
+
+        # Order the matches by position rather than scanning the whole list
+        tasks = [self.by_id[task_id] for task_id in sorted(ids, key=self.seqs.__getitem__)]
+        if filter_type == "Active":
+            return [task for task in tasks if not task.completed]
+        elif filter_type == "Completed":
+            return [task for task in tasks if task.completed]
+        return tasks
+
+    def counts(self):
+        """Number of tasks in each filter"""
+        return {
+            "All": len(self.tasks),
+            "Active": len(self.active),
+            "Completed": len(self.completed),
+        }
+
+    def _partition(self, task):
+        return self.completed if task.completed else self.active
+
+    def tasks_on_day(self, day):
+        """Tasks due on a calendar day, with Occurrences of recurring ones"""
+        tasks = [self.by_id[task_id] for task_id in self.by_day.get(day, ())]
+        for task in self.recurring.values():
+            for _, due in occurrences(task, day, day):
+                done = occurrence_done(day, done_through(task), done_days(task))
+                completed = task.completed or done
+                tasks.append(Occurrence(task, due, completed))
+        return tasks
+
+    def month_summary(self, year, month):
+        """Counts of the tasks due in a month"""
+        stats = dict(self.month_stats.get((year, month), {"total": 0, "completed": 0}))
+        for day_stats in self.recurring_summaries(year, month).values():
+            stats["total"] += day_stats["total"]
+            stats["completed"] += day_stats["completed"]
+        return {
+            "total": stats["total"],
+            "completed": stats["completed"],
+            "active": stats["total"] - stats["completed"],
+        }
+
+    def day_summaries(self, year, month):
+        """Counts of the tasks due on each day of a month that has any"""
+        summaries = {}
+        for day_number in range(1, calendar.monthrange(year, month)[1] + 1):
+            day = date(year, month, day_number)
+            stats = self.day_stats.get(day)
+            if stats:
+                summaries[day] = dict(stats)
+        for day, stats in self.recurring_summaries(year, month).items():
+            if day in summaries:
+                summaries[day]["total"] += stats["total"]
+                summaries[day]["completed"] += stats["completed"]
+            else:
+                summaries[day] = stats
+        return summaries
+
+    def recurring_summaries(self, year, month):
+        """Counts of the occurrences of recurring tasks on each day of a month"""
+        summaries = {}
+        if not self.recurring:
+            return summaries
+        start = date(year, month, 1)
+        end = date(year, month, calendar.monthrange(year, month)[1])
+        for task in self.recurring.values():
+            through = done_through(task)
+            done = set(done_days(task))
+            for day, _ in occurrences(task, start, end):
+                stats = summaries.setdefault(day, {"total": 0, "completed": 0})
+                stats["total"] += 1
+                if task.completed or occurrence_done(day, through, done):
+                    stats["completed"] += 1
+        return summaries
+
+    def _index_due(self, task):
+        self.reminders.schedule(task)
+        if task.extra and "repeat" in task.extra and repeat_rule(task) is not None:
+            self.recurring[task.id] = task
+            return
+        day = task.due_day
+        if day is None:
+            return
+        # A dict keeps the day's ids in insertion order with O(1) removal
+        self.by_day.setdefault(day, {})[task.id] = None
+        self._count(self.day_stats, day, task, 1)
+        self._count(self.month_stats, (day.year, day.month), task, 1)
+
+    def _unindex_due(self, task):
+        self.reminders.cancel(task.id)
+        if self.recurring.pop(task.id, None) is not None:
+            return
+        day = task.due_day
+        if day is None:
+            return
+        day_ids = self.by_day.get(day)
+        if day_ids is not None:
+            day_ids.pop(task.id, None)
+            if not day_ids:
+                del self.by_day[day]
+        self._count(self.day_stats, day, task, -1)
+        self._count(self.month_stats, (day.year, day.month), task, -1)
+
+    @staticmethod
+    def _count(stats_by_key, key, task, step):
+        """Add a task to (step 1) or take it from (step -1) a set of counts"""
+        stats = stats_by_key.setdefault(key, {"total": 0, "completed": 0})
+        stats["total"] += step
+        if task.completed:
+            stats["completed"] += step
+        if not stats["total"]:
+            del stats_by_key[key]
+
+
+JSON_SPACE_RE = re.compile(r"[ \t\r\n]*")
+NUMBER_CHARS = "0123456789+-.eE"  # A number cut at one of these may go on
+
+
+def iter_json_array(f, chunk_size=LOAD_READ_BYTES):
+    """Yield the elements of a JSON array from a file, reading it in chunks.
+
+    Malformed input raises ValueError, but only once the elements before
+    the fault have been yielded, so a caller must not save a list it read
+    from a file that failed part way.
+    """
+    decode = json.JSONDecoder().raw_decode
+    skip_space = JSON_SPACE_RE.match
+    buffer = ""
+    pos = 0
+    eof = False
+    # "start" before the "[", "first" right after it, "value" after a
+    # comma, "separator" after an element and "end" after the "]"
+    state = "start"
+
+    while True:
+        pos = skip_space(buffer, pos).end()
+
+        if pos < len(buffer):
+            char = buffer[pos]
+            if state == "separator":
+                if char == ",":
+                    state = "value"
+                    pos += 1
+                    continue
+                if char != "]":
+                    raise ValueError(f"Expected ',' or ']' but found {char!r}")
+                state = "end"
+                pos += 1
+                continue
+            if state == "start":
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                state = "first"
+                pos += 1
+                continue
+            if state == "end":
+                raise ValueError("Unexpected data after the JSON array")
+            if char == "]" and state == "first":
+                state = "end"
+                pos += 1
+                continue
+            if char in ",]":
+                raise ValueError(f"Expected a value but found {char!r}")
+
+            try:
+                value, end = decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The element runs past the end of the buffer, read more
+            else:
+                # A value ending at the buffer's end, or a number followed
+                # by what could be more of it, may be cut short
+                if eof or (end < len(buffer) and not (type(value) in (int, float) and buffer[end] in NUMBER_CHARS)):
+                    yield value
+                    state = "separator"
+                    pos = end
+                    continue
+
+        if eof:
+            if state in ("start", "end"):
+                return
+            raise ValueError("Unterminated JSON array")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+class TaskStorage:
+    """Base class of the task storage backends.
+
+    iter_load() yields the stored tasks in list order, reading them as it
+    goes so the caller can show the first ones before the rest are read;
+    load() returns them all at once. Changes are saved as
+    change records passed to apply(), i.e. {"op": "add", "task": {...}},
+    {"op": "update", "id": ..., "fields": {...}} or {"op": "delete", "id": ...},
+    except by backends with wants_snapshots set, which are handed the whole
+    task list through write_snapshot() instead.
+
+    Backends with supports_queries set can also answer count_tasks,
+    page_tasks, tasks_on_day and day_counts from storage, without the task
+    list in memory; the engine uses them while a streaming load runs.
+    Filters are the task view's "All", "Active" and "Completed".
+
+    Apart from load() and the queries, methods are called on the
+    persistence worker's thread.
+
+    To notice changes made by other processes, signature() sums up the
+    sizes and modification times of watched_files(). mark_synced() is
+    called after every read and write, so changed_since_sync() is only
+    true when someone else wrote to the files.
+    """
+
+    wants_snapshots = False
+    supports_queries = False
+    synced_signature = None
+
+    def iter_load(self):
+        raise NotImplementedError
+
+    def load(self):
+        return list(self.iter_load())
+
+    def apply(self, records):
+        raise NotImplementedError
+
+    def write_snapshot(self, snapshot):
+        raise NotImplementedError
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, snapshot):
+        self.write_snapshot(snapshot)
+
+    def has_changes(self):
+        """Whether there are saved changes not yet folded into the main file"""
+        return False
+
+    def watched_files(self):
+        """Files whose contents make up the stored tasks"""
+        return []
+
+    def signature(self):
+        signature = []
+        for path in self.watched_files():
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def mark_synced(self):
+        """Remember the files as they are now, after reading or writing them"""
+        self.synced_signature = self.signature()
+
+    def changed_since_sync(self):
+        return self.signature() != self.synced_signature
+
+    def close(self):
+        pass
+
+
+class JsonStorage(TaskStorage):
+    """All tasks in one JSON file, rewritten on every change"""
+
+    wants_snapshots = True
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+
+    def iter_load(self):
+        if not os.path.exists(self.data_file):
+            return
+        with open(self.data_file, "r") as f:
+            yield from iter_json_array(f)
+
+    def write_snapshot(self, snapshot):
+        write_json_atomic(self.data_file, snapshot)
+
+    def watched_files(self):
+        return [self.data_file]
+
+
+class JournalStorage(TaskStorage):
+    """A JSON snapshot plus an append-only log of change records.
+
+    The snapshot is the regular tasks file. Every change is appended to
+    "<data_file>.journal" as one JSON line, e.g. {"op": "update", "id": ...,
+    "fields": {...}}, so saving a change costs the same however many tasks
+    there are. Once the log grows past compact_bytes it is folded into a
+    fresh snapshot by the PersistenceWorker.
+
+    Replaying a record twice has no effect, so a compaction interrupted at
+    any point never loses or duplicates changes.
+    """
+
+    def __init__(self, data_file, compact_bytes=JOURNAL_COMPACT_BYTES):
+        self.data_file = data_file
+        self.journal_file = data_file + ".journal"
+        # The log being folded into the snapshot by a running compaction
+        self.compacting_file = data_file + ".journal.compacting"
+        self.compact_bytes = compact_bytes
+
+    def iter_load(self):
+        """Stream the snapshot with the change log replayed on top of it"""
+        # The log is small (it is compacted past compact_bytes), so read it
+        # first and group its records by task id
+        changes = {}
+        for path in (self.compacting_file, self.journal_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A write cut short by a crash, apply() starts the
+                        # records written after it on a line of their own
+                        continue
+                    task_id = record["task"].get("id") if record.get("op") == "add" else record.get("id")
+                    # Ids may be saved as "12" or 12, match them as the store does
+                    changes.setdefault(Task.parse_id(task_id), []).append(record)
+
+        if os.path.exists(self.data_file):
+            with open(self.data_file, "r") as f:
+                for task in iter_json_array(f):
+                    records = changes.pop(Task.parse_id(task.get("id")), None)
+                    if records:
+                        task = self.replay(task, records)
+                    if task is not None:
+                        yield task
+
+        # Tasks added since the snapshot was written
+        for records in changes.values():
+            task = self.replay(None, records)
+            if task is not None:
+                yield task
+
+    @staticmethod
+    def replay(task, records):
+        """Apply a task's change records in order, None means deleted"""
+        for record in records:
+            op = record.get("op")
+            if op == "add":
+                task = dict(record["task"])
+            elif op == "update":
+                if task is not None:
+                    task.update(record["fields"])
+            elif op == "delete":
+                task = None
+        return task
+
+    def apply(self, records):
+        """Append change records to the log"""
+        text = "".join(json.dumps(record) + "\n" for record in records)
+        with open(self.journal_file, "a+b") as f:
+            if f.tell():
+                # The last record may have been cut short by a crash
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    text = "\n" + text
+            f.write(text.encode())
+
+    def needs_compaction(self):
+        try:
+            return os.path.getsize(self.journal_file) > self.compact_bytes
+        except OSError:
+            return False
+
+    def compact(self, snapshot):
+        """Fold the change log into a new snapshot.
+
+        snapshot must be a copy of the current tasks, i.e. the old snapshot
+        plus every logged change. Changes appended afterwards go to a new log
+        that is replayed on top of the new snapshot.
+        """
+        # Start a new log for later changes
+        if os.path.exists(self.journal_file):
+            if os.path.exists(self.compacting_file):
+                # Left over from an interrupted compaction, keep both in order
+                with open(self.journal_file, "r") as src, open(self.compacting_file, "a") as dst:
+                    dst.write(src.read())
+                os.remove(self.journal_file)
+            else:
+                os.replace(self.journal_file, self.compacting_file)
+
+        write_json_atomic(self.data_file, snapshot)
+        if os.path.exists(self.compacting_file):
+            os.remove(self.compacting_file)
+
+    def write_snapshot(self, snapshot):
+        self.compact(snapshot)
+
+    def has_changes(self):
+        return os.path.exists(self.journal_file) or os.path.exists(self.compacting_file)
+
+    def watched_files(self):
+        return [self.data_file, self.journal_file, self.compacting_file]
+
+
+def write_json_atomic(path, data):
+    """Write data as JSON to a temporary file and rename it over path"""
+    temp_file = path + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+
+
+class SqliteStorage(TaskStorage):
+    """Tasks stored as rows of an indexed SQLite table.
+
+    Changes are written row by row, so saving costs the same however many
+    tasks there are, and the completed, due day and created columns are
+    indexed so filter counts, filter pages and day lookups are index
+    queries. Keys without a column of their own are kept as JSON in the
+    extra column.
+
+    Rows are kept in list order by seq. A deleted task's seq is remembered
+    for the session, so undoing the delete puts its row back in place.
+
+    Each thread gets its own connection; the database runs in WAL mode so
+    queries on the UI thread do not wait for the writer.
+    """
+
+    supports_queries = True
+    columns = ("id", "text", "completed", "date", "due_date")
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.local = threading.local()
+        self.created = not os.path.exists(db_file)
+        self.deleted_seqs = {}  # id -> seq of the rows deleted this session
+        self.connection()
+
+    def watched_files(self):
+        return [self.db_file, self.db_file + "-wal"]
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.db_file)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    seq INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    text TEXT NOT NULL DEFAULT '',
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    created TEXT,
+                    due_date TEXT,
+                    due_day TEXT,
+                    extra TEXT
+                );
+                CREATE INDEX IF NOT EXISTS tasks_completed ON tasks (completed, seq);
+                CREATE INDEX IF NOT EXISTS tasks_due_day ON tasks (due_day);
+                CREATE INDEX IF NOT EXISTS tasks_created ON tasks (created);
+            """)
+            self.local.conn = conn
+        return conn
+
+    def row_values(self, task):
+        day = due_day(task.get("due_date"))
+        extra = {key: value for key, value in task.items() if key not in self.columns}
+        return (
+            task["id"],
+            task.get("text", ""),
+            1 if task.get("completed") else 0,
+            task.get("date"),
+            task.get("due_date"),
+            day.isoformat() if day else None,
+            json.dumps(extra) if extra else None,
+        )
+
+    @staticmethod
+    def row_task(row):
+        task_id, text, completed, created, due_date, extra = row
+        task = {
+            "id": task_id,
+            "text": text,
+            "completed": bool(completed),
+            "date": created,
+            "due_date": due_date,
+        }
+        if extra:
+            task.update(json.loads(extra))
+        return task
+
+    def iter_load(self):
+        rows = self.connection().execute(
+            "SELECT id, text, completed, created, due_date, extra FROM tasks ORDER BY seq"
+        )
+        for row in rows:
+            yield self.row_task(row)
+
+    def apply(self, records):
+        conn = self.connection()
+        with conn:
+            for record in records:
+                op = record.get("op")
+                if op == "add":
+                    # A task deleted earlier, e.g. one whose delete is being
+                    # undone, goes back to its old place when that is free
+                    seq = self.deleted_seqs.pop(record["task"]["id"], None)
+                    taken = conn.execute("SELECT 1 FROM tasks WHERE seq = ?", (seq,)).fetchone()
+                    if taken:
+                        seq = None
+                    conn.execute(
+                        "INSERT INTO tasks (seq, id, text, completed, created, due_date, due_day, extra)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT (id) DO UPDATE SET text = excluded.text,"
+                        " completed = excluded.completed, created = excluded.created,"
+                        " due_date = excluded.due_date, due_day = excluded.due_day,"
+                        " extra = excluded.extra",
+                        (seq,) + self.row_values(record["task"])
+                    )
+                elif op == "update":
+                    self.update_row(conn, record["id"], record["fields"])
+                elif op == "delete":
+                    row = conn.execute(
+                        "SELECT seq FROM tasks WHERE id = ?", (record["id"],)
+                    ).fetchone()
+                    if row is not None:
+                        self.deleted_seqs[record["id"]] = row[0]
+                        conn.execute("DELETE FROM tasks WHERE seq = ?", row)
+
+    def update_row(self, conn, task_id, fields):
+        row = conn.execute(
+            "SELECT id, text, completed, created, due_date, extra FROM tasks WHERE id = ?",
+            (task_id,)
+        ).fetchone()
+        if row is None:
+            return
+        task = self.row_task(row)
+        task.update(fields)
+        values = self.row_values(task)
+        conn.execute(
+            "UPDATE tasks SET text = ?, completed = ?, created = ?, due_date = ?,"
+            " due_day = ?, extra = ? WHERE id = ?",
+            values[1:] + (task_id,)
+        )
+
+    def write_snapshot(self, snapshot):
+        conn = self.connection()
+        self.deleted_seqs.clear()
+        with conn:
+            conn.execute("DELETE FROM tasks")
+            conn.executemany(
+                "INSERT INTO tasks (id, text, completed, created, due_date, due_day, extra)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.row_values(task) for task in snapshot)
+            )
+
+    # Queries, see TaskStorage
+
+    filter_clauses = {
+        "All": "",
+        "Active": "completed = 0",
+        "Completed": "completed = 1",
+    }
+    # Recurring tasks are left out of the due day queries, their
+    # occurrences are worked out from the tasks in memory
+    one_off_clause = "(extra IS NULL OR extra NOT LIKE '%\"repeat\"%')"
+
+    def select(self, where="", params=(), tail=""):
+        sql = "SELECT id, text, completed, created, due_date, extra FROM tasks"
+        if where:
+            sql += " WHERE " + where
+        sql += " ORDER BY seq" + tail
+        return [self.row_task(row) for row in self.connection().execute(sql, params)]
+
+    def count_tasks(self, filter_type="All"):
+        sql = "SELECT COUNT(*) FROM tasks"
+        if self.filter_clauses[filter_type]:
+            sql += " WHERE " + self.filter_clauses[filter_type]
+        return self.connection().execute(sql).fetchone()[0]
+
+    def page_tasks(self, filter_type="All", offset=0, limit=100):
+        """Tasks matching a filter, limit at a time starting at offset"""
+        return self.select(self.filter_clauses[filter_type], (limit, offset), " LIMIT ? OFFSET ?")
+
+    def tasks_on_day(self, day):
+        """Tasks due on a day, recurring ones left out"""
+        return self.select("due_day = ? AND " + self.one_off_clause, (day.isoformat(),))
+
+    def day_counts(self, start, end):
+        """Total and completed counts of the tasks due on each day from start to end"""
+        rows = self.connection().execute(
+            "SELECT due_day, COUNT(*), SUM(completed) FROM tasks"
+            " WHERE due_day BETWEEN ? AND ? AND " + self.one_off_clause + " GROUP BY due_day",
+            (start.isoformat(), end.isoformat())
+        )
+        return {
+            date.fromisoformat(day): {"total": total, "completed": completed}
+            for day, total, completed in rows
+        }
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+def import_tasks_file(storage, data_file):
+    """Copy the tasks of a tasks.json (and its journal) into a new SqliteStorage.
+
+    The tasks pass through a TaskStore so tasks sharing an id, which the
+    id column does not allow, get ids of their own. The rows are written
+    in one transaction; if that fails the database is removed again, so
+    the next start tries the import once more rather than opening an
+    empty database.
+    """
+    store = TaskStore()
+    try:
+        store.extend(JournalStorage(data_file).load())
+        storage.write_snapshot([task.to_dict() for task in store.tasks])
+    except Exception:
+        storage.close()
+        for path in (storage.db_file, storage.db_file + "-wal", storage.db_file + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+
+def open_storage(mode, data_file):
+    """Create the storage backend for a storage mode"""
+    if mode == "sqlite":
+        storage = SqliteStorage(os.path.splitext(data_file)[0] + ".db")
+        if storage.created and os.path.exists(data_file):
+            # First run on SQLite, bring over the tasks kept so far
+            import_tasks_file(storage, data_file)
+        return storage
+    if mode == "json":
+        return JsonStorage(data_file)
+    return JournalStorage(data_file)
+
+
+class TaskArchive:
+    """Completed tasks moved out of the working set, in monthly segment files.
+
+    Each segment, e.g. tasks_archive/2023-04.json, holds the archived tasks
+    due in one month, or created in it if they have no due date. Segments
+    are not read at startup. A segment is read when something asks about
+    its month or when the Completed filter pages back to it, and is then
+    kept in memory as a TaskStore.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = {}  # (year, month) -> TaskStore of a loaded segment
+        self.keys = None  # (year, month) of every segment on disk, listed on demand
+        self.paged = []  # Segments paged in by the Completed filter, newest first
+
+    @staticmethod
+    def segment_key(task):
+        day = task.due_day or local_day(task.created) or date.today()
+        return (day.year, day.month)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key[0]:04d}-{key[1]:02d}.json")
+
+    def segment_keys(self):
+        if self.keys is None:
+            self.keys = set()
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                names = []
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    year, month = name[:-len(".json")].split("-")
+                    self.keys.add((int(year), int(month)))
+                except ValueError:
+                    continue
+        return self.keys
+
+    def segment(self, key):
+        """The archived tasks of a month, or None if none were archived"""
+        store = self.segments.get(key)
+        if store is None and key in self.segment_keys():
+            store = TaskStore()
+            try:
+                with open(self.path(key), "r") as f:
+                    store.reset(json.load(f))
+            except Exception as e:
+                print(f"Error loading archive segment {self.path(key)}: {e}")
+            self.segments[key] = store
+        return store
+
+    def write_segment(self, key):
+        store = self.segments[key]
+        if store.tasks:
+            os.makedirs(self.directory, exist_ok=True)
+            write_json_atomic(self.path(key), [task.to_dict() for task in store.tasks])
+            self.segment_keys().add(key)
+        else:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            self.segment_keys().discard(key)
+
+    def add(self, tasks):
+        """Archive tasks, writing each segment they go to once"""
+        by_key = {}
+        for task in tasks:
+            by_key.setdefault(self.segment_key(task), []).append(task)
+        for key, segment_tasks in by_key.items():
+            store = self.segment(key)
+            if store is None:
+                store = self.segments[key] = TaskStore()
+            for task in segment_tasks:
+                if task.id not in store:
+                    store.add(task)
+            self.write_segment(key)
+
+    def iter_tasks(self):
+        """Yield every archived task in the tasks.json layout.
+
+        Segments not loaded are streamed from disk rather than loaded.
+        """
+        for key in sorted(self.segment_keys()):
+            store = self.segments.get(key)
+            if store is not None:
+                for task in store.tasks:
+                    yield task.to_dict()
+                continue
+            try:
+                with open(self.path(key), "r") as f:
+                    yield from iter_json_array(f)
+            except Exception as e:
+                print(f"Error reading archive segment {self.path(key)}: {e}")
+
+    def find(self, task_id):
+        """An archived task in one of the loaded segments, or None"""
+        for store in self.segments.values():
+            task = store.get(task_id)
+            if task is not None:
+                return task
+        return None
+
+    def remove(self, task_id):
+        """Take a task out of the loaded segments and return it, or None"""
+        for key, store in self.segments.items():
+            task = store.remove(task_id)
+            if task is not None:
+                self.write_segment(key)
+                return task
+        return None
+
+    def tasks_on_day(self, day):
+        store = self.segment((day.year, day.month))
+        return store.tasks_on_day(day) if store else []
+
+    def day_summaries(self, year, month):
+        store = self.segment((year, month))
+        return store.day_summaries(year, month) if store else {}
+
+    def month_summary(self, year, month):
+        store = self.segment((year, month))
+        return store.month_summary(year, month) if store else None
+
+    def has_older(self):
+        """Whether page_older has segments left to read"""
+        return len(self.paged) < len(self.segment_keys())
+
+    def page_older(self):
+        """Read the newest segment not paged in yet, returns its task count"""
+        for key in sorted(self.segment_keys(), reverse=True):
+            if key not in self.paged:
+                self.paged.append(key)
+                return len(self.segment(key))
+        return 0
+
+    def paged_tasks(self):
+        """Tasks of the segments paged in by the Completed filter, newest first"""
+        tasks = []
+        for key in self.paged:
+            if key in self.segment_keys():
+                tasks.extend(self.segment(key).tasks)
+        return tasks
+
+
+class PersistenceWorker:
+    """Writes task changes to disk on a background thread.
+
+    The UI thread hands over jobs and never waits on I/O:
+
+    ("records", [...])  change records to apply to the storage
+    ("snapshot", [...]) the whole task list to write to the storage
+    ("compact", [...])  a copy of the task list to compact the storage to
+
+    Jobs are handled in order. A burst of jobs that arrives within
+    coalesce_delay is written together: adjacent change records are applied
+    in one batch and only the newest snapshot is written. Each write reports
+    ("saved", count), ("compact_needed", None) or ("error", message) on the
+    results queue, which the UI thread polls.
+    """
+
+    def __init__(self, storage, coalesce_delay=PERSIST_COALESCE_SECONDS, background=True):
+        self.storage = storage
+        self.coalesce_delay = coalesce_delay
+        self.background = background
+        self.jobs = []
+        self.busy = False
+        self.stopping = False
+        self.condition = threading.Condition()
+        self.results = queue.Queue()
+        self.thread = None
+        if background:
+            self.thread = threading.Thread(target=self.run, name="persistence", daemon=True)
+            self.thread.start()
+
+    def submit(self, kind, payload):
+        if not self.background:
+            # Write straight away on the caller's thread
+            try:
+                self.write([(kind, payload)])
+            except Exception as e:
+                self.results.put(("error", str(e)))
+            return
+        with self.condition:
+            self.jobs.append((kind, payload))
+            self.condition.notify_all()
+
+    def pending(self):
+        with self.condition:
+            return bool(self.jobs) or self.busy
+
+    def flush(self):
+        """Block until every submitted job has been written"""
+        with self.condition:
+            while self.jobs or self.busy:
+                self.condition.wait()
+
+    def stop(self):
+        """Write the remaining jobs and end the thread"""
+        if self.thread is None:
+            self.storage.close()
+            return
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs and not self.stopping:
+                    self.condition.wait()
+                if not self.jobs:
+                    self.storage.close()
+                    return
+                stopping = self.stopping
+
+            # Let the rest of a burst arrive so it goes out in one write
+            if not stopping:
+                time.sleep(self.coalesce_delay)
+
+            with self.condition:
+                jobs, self.jobs = self.jobs, []
+                self.busy = True
+            try:
+                self.write(jobs)
+            except Exception as e:
+                self.results.put(("error", str(e)))
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def write(self, jobs):
+        # Only the newest full snapshot matters
+        last_snapshot = max((i for i, (kind, _) in enumerate(jobs) if kind == "snapshot"), default=None)
+
+        records = []
+        for i, (kind, payload) in enumerate(jobs):
+            if kind == "records":
+                records.extend(payload)
+                continue
+            # Records saved before a compaction must land in the old log
+            if records:
+                self.storage.apply(records)
+                records = []
+            if kind == "compact":
+                self.storage.compact(payload)
+            elif kind == "snapshot" and i == last_snapshot:
+                self.storage.write_snapshot(payload)
+        if records:
+            self.storage.apply(records)
+        # What is on disk now is our own doing
+        self.storage.mark_synced()
+
+        self.results.put(("saved", len(jobs)))
+        with self.condition:
+            compact_queued = any(kind == "compact" for kind, _ in self.jobs)
+        if not compact_queued and self.storage.needs_compaction():
+            self.results.put(("compact_needed", None))
+
+
+class StorageWatcher:
+    """Tells whether the storage files may have changed since the last poll.
+
+    Uses watchdog (inotify and the like) when it is installed. Without it
+    every poll answers yes, and the caller falls back on comparing the
+    storage signature, which costs a stat per file.
+    """
+
+    def __init__(self, paths):
+        self.paths = {os.path.abspath(path) for path in paths}
+        self.changed = threading.Event()
+        self.observer = None
+        if Observer is None or not self.paths:
+            return
+        try:
+            handler = FileSystemEventHandler()
+            handler.on_any_event = self.on_event
+            self.observer = Observer()
+            self.observer.daemon = True
+            for directory in {os.path.dirname(path) for path in self.paths}:
+                self.observer.schedule(handler, directory)
+            self.observer.start()
+        except Exception as e:
+            print(f"Could not watch task storage, polling it instead: {e}")
+            self.observer = None
+
+    def on_event(self, event):
+        for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path and os.path.abspath(path) in self.paths:
+                self.changed.set()
+
+    def poll(self):
+        if self.observer is None:
+            return True
+        if self.changed.is_set():
+            self.changed.clear()
+            return True
+        return False
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join(timeout=1)
+            self.observer = None
+
+
+class AsyncRunner:
+    """An asyncio event loop on a thread of its own.
+
+    Slow work (reading storage, imports, syncing) can be written as
+    coroutines and handed over with submit(); blocking calls inside them
+    go through loop.run_in_executor. Results are never handed to callbacks on
+    the loop's thread: they wait on the results queue until the owning
+    thread calls poll(), so a Tk app runs them on its own thread from an
+    after() loop:
+
+        runner = AsyncRunner()
+        runner.submit(engine.read_external_changes(), on_done=show_changes)
+        ...
+        runner.poll()  # every few ms while runner.pending()
+
+    The loop and its thread are only started by the first submit().
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self.results = queue.Queue()
+        self.running = 0  # Jobs whose results were not polled yet
+
+    def start(self):
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, name="asyncio", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        import asyncio
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+            # Stopped, let the jobs still running see the cancellation
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        finally:
+            self.loop.close()
+
+    def submit(self, coro, on_done=None, on_error=None):
+        """Run a coroutine on the loop.
+
+        Once it finishes, poll() calls on_done with its result, or on_error
+        with the exception it raised. Returns a concurrent.futures.Future.
+        """
+        import asyncio
+        if self.thread is None:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self.running += 1
+        future.add_done_callback(lambda future: self.finished(future, on_done, on_error))
+        return future
+
+    def finished(self, future, on_done, on_error):
+        # Runs on the loop's thread, only hands the result over
+        try:
+            self.results.put((on_done, future.result(), None))
+        except BaseException as e:
+            self.results.put((on_error, None, e))
+
+    def pending(self):
+        return self.running > 0
+
+    def poll(self):
+        """Call the callbacks of finished jobs on the calling thread"""
+        while True:
+            try:
+                callback, value, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.running -= 1
+            if error is None:
+                if callback is not None:
+                    callback(value)
+            elif callback is not None:
+                callback(error)
+            else:
+                print(f"Background job failed: {error!r}")
+
+    def stop(self, timeout=1):
+        """Cancel the running jobs and end the loop's thread"""
+        if self.thread is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout)
+
+
+class CommandLog:
+    """Undo and redo history of task changes.
+
+    A command is a (label, forward, inverse) tuple. forward and inverse are
+    lists of small change records, one per task:
+
+        ("add", seq, task)        put task back at position stamp seq
+        ("update", id, fields)    apply fields, in the tasks.json layout
+        ("delete", id)            remove the task
+
+    An update keeps only the fields it changed, and a delete keeps the
+    removed Task object rather than a copy, so the log never holds
+    snapshots of the task list. Once the log holds more than max_records
+    records the oldest commands are dropped.
+    """
+
+    def __init__(self, max_records=UNDO_MAX_RECORDS):
+        self.max_records = max_records
+        self.clear()
+
+    def clear(self):
+        self.undo_stack = collections.deque()
+        self.redo_stack = []
+        self.records = 0
+
+    @staticmethod
+    def size(command):
+        # One record per task changed
+        return max(len(command[1]), len(command[2]))
+
+    def push(self, label, forward, inverse, merge=False):
+        """Record a command that was just done; it clears the redo stack.
+
+        With merge, a command following one with the same label is folded
+        into it, so e.g. an import saved in batches is undone in one step.
+        """
+        for command in self.redo_stack:
+            self.records -= self.size(command)
+        self.redo_stack = []
+        if merge and self.undo_stack and self.undo_stack[-1][0] == label:
+            command = self.undo_stack.pop()
+            self.records -= self.size(command)
+            command = (label, command[1] + forward, command[2] + inverse)
+        else:
+            command = (label, forward, inverse)
+        self.undo_stack.append(command)
+        self.records += self.size(command)
+        while self.records > self.max_records and self.undo_stack:
+            self.records -= self.size(self.undo_stack.popleft())
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        """Take the last command to undo, or None"""
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self):
+        """Take the last undone command to do again, or None"""
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        self.undo_stack.append(command)
+        return command
+
+
+class TaskEngine:
+    """Task logic without any UI: loading, saving, changes and queries.
+
+    TodoApp is a view over an engine; scripts, benchmarks and batch jobs
+    can drive one directly, no display needed:
+
+        engine = TaskEngine("tasks.json")
+        engine.load()
+        engine.add_task("Write report", due=datetime(2025, 5, 5))
+        engine.close()
+
+    Changes are saved by a PersistenceWorker thread, or before each call
+    returns with background=False. Backends that save whole snapshots
+    (storage_mode "json") are written on commit(), so a burst of changes
+    costs one write; close() commits too.
+
+    archive_completed() moves old completed tasks to a TaskArchive. Lookups
+    by day and month and the paged Completed filter include archived
+    tasks; changing an archived task brings it back into the working set.
+
+    Every change made through the engine is recorded in history, a
+    CommandLog, and can be taken back with undo() and done again with
+    redo(). Loading and merging outside changes start a new history.
+    """
+
+    def __init__(self, data_file="tasks.json", storage_mode=STORAGE_MODE, background=True):
+        self.data_file = data_file
+        self.storage_mode = storage_mode
+        self.store = TaskStore()
+        self.storage = open_storage(storage_mode, data_file)
+        self.persistence = PersistenceWorker(self.storage, background=background)
+        self.archive = TaskArchive(os.path.splitext(data_file)[0] + "_archive")
+        self.watcher = None  # Started by the first sync_external_changes
+        self.history = CommandLog()
+        self.revision = 0  # Counts the changes saved, see merge_read
+        self.resync = False  # Read the storage on the next check regardless
+        self.snapshot_dirty = False
+        self.loading = False
+        self.load_iter = None
+        self.load_counts = None  # Filter counts from the storage while loading
+        # Why the last load failed part way, if it did; see safe_to_save
+        self.load_error = None
+
+    @property
+    def tasks(self):
+        return self.store.tasks
+
+    def __len__(self):
+        return len(self.store)
+
+    # Loading
+
+    def load(self):
+        """Read every task from storage, replacing the current ones"""
+        # Anything still queued for writing must reach the disk first
+        self.persistence.flush()
+
+        # A full load replaces a streaming one still in progress
+        self.loading = False
+        self.load_iter = None
+        self.history.clear()
+
+        self.load_error = None
+        try:
+            self.storage.mark_synced()
+            self.store.reset(self.storage.load())
+        except Exception as e:
+            print(f"Error loading tasks: {e}")
+            self.load_error = str(e)
+            self.store.reset([])
+        self.save_renamed()
+
+    def start_loading(self):
+        """Begin streaming tasks from storage, see load_some"""
+        self.store.reset([])
+        self.history.clear()
+        self.storage.mark_synced()
+        self.load_iter = self.storage.iter_load()
+        self.load_counts = None
+        self.load_error = None
+        self.loading = True
+
+    def load_some(self, seconds):
+        """Read streamed tasks for about the given time.
+
+        Returns True once every task has been read.
+        """
+        if not self.loading:
+            return True
+
+        deadline = time.perf_counter() + seconds
+        batch = []
+        finished = False
+        try:
+            while True:
+                batch.append(next(self.load_iter))
+                if len(batch) % 256 == 0 and time.perf_counter() >= deadline:
+                    break
+        except StopIteration:
+            finished = True
+        except Exception as e:
+            print(f"Error loading tasks: {e}")
+            self.load_error = str(e)
+            finished = True
+
+        self.store.extend(batch)
+        if finished:
+            self.loading = False
+            self.load_iter = None
+            self.save_renamed()
+        return finished
+
+    def finish_loading(self):
+        """Read the rest of a streaming load right away"""
+        while not self.load_some(1.0):
+            pass
+
+    def safe_to_save(self):
+        """Whether whole snapshots of the store may be written.
+
+        Not after a load that failed part way: the store then holds only
+        some of the stored tasks and a snapshot would drop the rest. Change
+        records are still saved, they only touch the tasks they name.
+        """
+        return self.load_error is None
+
+    def save_renamed(self):
+        """Save the ids given to tasks that shared an id with another.
+
+        Change records name tasks by id, so until the new ids are on disk
+        the next load would hand out different ones and the records saved
+        for these tasks would be lost.
+        """
+        if not self.store.renamed or not self.safe_to_save():
+            return
+        self.store.renamed = 0
+        self.persistence.submit("compact", self.snapshot())
+
+    # Queries
+
+    def get(self, task_id):
+        task = self.store.get(task_id)
+        if task is None:
+            task = self.archive.find(task_id)
+        return task
+
+    def loading_queries(self):
+        """The storage while it answers lookups in place of the store.
+
+        During a streaming load the store only holds the tasks read so far;
+        storage with supports_queries has them all, indexed, so filters,
+        counts and the calendar are complete from the first paint.
+        """
+        if self.loading and self.storage.supports_queries:
+            return self.storage
+        return None
+
+    def stored_tasks(self, rows):
+        """Tasks for rows read by a query, the loaded Task where there is one"""
+        tasks = []
+        for data in rows:
+            task = self.store.get(Task.parse_id(data.get("id")))
+            tasks.append(task if task is not None else Task.from_dict(data))
+        return tasks
+
+    def filtered(self, filter_type="All"):
+        """Tasks shown by one of the task view's filters, do not change the list"""
+        queries = self.loading_queries()
+        if queries is not None:
+            return self.stored_tasks(queries.page_tasks(filter_type, 0, LOAD_PAGE_SIZE))
+        tasks = self.store.filtered(filter_type)
+        if filter_type == "Completed" and self.archive.paged:
+            tasks = tasks + self.archived(self.archive.paged_tasks())
+        return tasks
+
+    def search(self, query, filter_type="All"):
+        return self.store.search(query, filter_type)
+
+    def next_reminder(self):
+        """Timestamp of the next active task to come due, or None"""
+        return self.store.reminders.next_due()
+
+    def due_reminders(self, now=None):
+        """Active tasks that came due since the last call, earliest first.
+
+        Recurring tasks are scheduled again for their following occurrence.
+        """
+        reminders = self.store.reminders
+        tasks = [self.store.by_id[task_id] for task_id in reminders.pop_due(now)]
+        for task in tasks:
+            if task.id in self.store.recurring:
+                reminders.schedule(task)
+        return tasks
+
+    def build_search_index(self, seconds=None):
+        return self.store.build_search_index(seconds)
+
+    def counts(self):
+        queries = self.loading_queries()
+        if queries is None:
+            return self.store.counts()
+        # Counted once per load, the store takes over when it is done
+        if self.load_counts is None:
+            self.load_counts = {
+                filter_type: queries.count_tasks(filter_type)
+                for filter_type in ("All", "Active", "Completed")
+            }
+        return dict(self.load_counts)
+
+    def tasks_on_day(self, day):
+        queries = self.loading_queries()
+        if queries is None:
+            tasks = self.store.tasks_on_day(day)
+        else:
+            # Recurring tasks are only known once loaded
+            tasks = self.stored_tasks(queries.tasks_on_day(day))
+            tasks += [task for task in self.store.tasks_on_day(day) if isinstance(task, Occurrence)]
+        return tasks + self.archived(self.archive.tasks_on_day(day))
+
+    def stored_day_summaries(self, year, month):
+        """Like TaskStore.day_summaries, from the storage while loading"""
+        queries = self.loading_queries()
+        if queries is None:
+            return self.store.day_summaries(year, month)
+        start = date(year, month, 1)
+        end = date(year, month, calendar.monthrange(year, month)[1])
+        summaries = queries.day_counts(start, end)
+        for day, stats in self.store.recurring_summaries(year, month).items():
+            if day in summaries:
+                summaries[day]["total"] += stats["total"]
+                summaries[day]["completed"] += stats["completed"]
+            else:
+                summaries[day] = stats
+        return summaries
+
+    def month_summary(self, year, month):
+        if self.loading_queries() is None:
+            summary = self.store.month_summary(year, month)
+        else:
+            summary = {"total": 0, "completed": 0}
+            for stats in self.stored_day_summaries(year, month).values():
+                summary["total"] += stats["total"]
+                summary["completed"] += stats["completed"]
+            summary["active"] = summary["total"] - summary["completed"]
+        archived = self.archive.month_summary(year, month)
+        if archived:
+            for key in summary:
+                summary[key] += archived[key]
+        return summary
+
+    def day_summaries(self, year, month):
+        summaries = self.stored_day_summaries(year, month)
+        for day, stats in self.archive.day_summaries(year, month).items():
+            if day in summaries:
+                summaries[day]["total"] += stats["total"]
+                summaries[day]["completed"] += stats["completed"]
+            else:
+                summaries[day] = stats
+        return summaries
+
+    def archived(self, tasks):
+        # A crash while archiving can leave a task in both places
+        return [task for task in tasks if task.id not in self.store]
+
+    # Changes
+
+    def new_id(self):
+        return self.store.new_id()
+
+    def add_task(self, text, due=None, created=None, repeat=None):
+        """Create a task and return it.
+
+        repeat makes it a recurring task starting at due (or now), e.g.
+        {"every": "week", "interval": 2, "until": "2025-12-31"}; see repeat_rule.
+        """
+        task = Task(
+            self.new_id(),
+            text,
+            completed=False,
+            created=created or datetime.now(),
+            due=due
+        )
+        if repeat:
+            if task.due is None:
+                task.due = task.created
+            task.set_extra("repeat", dict(repeat))
+        self.store.add(task)
+        self.persist({"op": "add", "task": task.to_dict()})
+        self.history.push("Add task", [("add", self.store.seqs[task.id], task)], [("delete", task.id)])
+        return task
+
+    def add_tasks(self, tasks, label="Add tasks", merge=False):
+        """Add tasks given in the tasks.json layout in one batch.
+
+        Tasks without an id get a new one and tasks whose id is taken are
+        skipped. The batch is saved as a single write and undone in one
+        step (merge as in CommandLog.push); returns the added tasks.
+        """
+        added = []
+        for data in tasks:
+            task = Task.from_dict(data)
+            if task.id is None or task.id == "":
+                task.id = self.new_id()
+            elif task.id in self.store:
+                continue
+            self.store.add(task)
+            added.append(task)
+        if added:
+            self.persist(*[{"op": "add", "task": task.to_dict()} for task in added])
+            forward = [("add", self.store.seqs[task.id], task) for task in added]
+            self.history.push(label, forward, [("delete", task.id) for task in added], merge)
+        return added
+
+    def update_task(self, task_id, fields, label="Edit task"):
+        """Apply field changes in the tasks.json layout, returns the task or None"""
+        self.restore(task_id)
+        task = self.store.get(task_id)
+        if task is not None:
+            old = self.old_fields(task, fields)
+            self.store.update(task_id, fields)
+            self.persist({"op": "update", "id": str(task_id), "fields": fields})
+            self.history.push(label, [("update", task_id, fields)], [("update", task_id, old)])
+        return task
+
+    def toggle_task(self, task_id, completed):
+        """Complete or reopen a task; for a recurring task, its next occurrence"""
+        task = self.get(task_id)
+        if task is not None and repeat_rule(task) is not None:
+            label = "Complete occurrence" if completed else "Reopen occurrence"
+            return self.update_task(task_id, occurrence_fields(task, completed), label)
+        # The completion time decides when the task is archived
+        completed_at = datetime.now().isoformat() if completed else None
+        label = "Complete task" if completed else "Reopen task"
+        return self.update_task(task_id, {"completed": completed, "completed_at": completed_at}, label)
+
+    def delete_task(self, task_id):
+        """Delete a task, returns it or None if there was no such task"""
+        if task_id in self.store:
+            seq = self.store.seqs[task_id]
+            task = self.store.remove(task_id)
+            self.persist({"op": "delete", "id": str(task_id)})
+        else:
+            # Undoing puts an archived task back into the working set
+            seq = None
+            task = self.archive.remove(task_id)
+        if task is not None:
+            self.history.push("Delete task", [("delete", task_id)], [("add", seq, task)])
+        return task
+
+    def update_tasks(self, task_ids, fields, label=None):
+        """Apply the same field changes to several tasks in one batch.
+
+        fields can also be a function giving each task's changes. The batch
+        is saved as a single write and undone in one step; returns the
+        changed tasks.
+        """
+        changed = []
+        forward = []
+        inverse = []
+        for task_id in task_ids:
+            self.restore(task_id)
+            task = self.store.get(task_id)
+            if task is not None:
+                task_fields = fields(task) if callable(fields) else fields
+                forward.append(("update", task_id, task_fields))
+                inverse.append(("update", task_id, self.old_fields(task, task_fields)))
+                self.store.update(task_id, task_fields)
+                changed.append(task)
+        if changed:
+            self.persist(*[{"op": "update", "id": str(task_id), "fields": task_fields}
+                           for _, task_id, task_fields in forward])
+            self.history.push(label or f"Edit {len(changed)} tasks", forward, inverse)
+        return changed
+
+    def set_completed(self, task_ids, completed):
+        """Complete or reopen several tasks in one batch.
+
+        Recurring tasks get their next occurrence completed or reopened.
+        """
+        completed_at = datetime.now().isoformat() if completed else None
+        plain = {"completed": completed, "completed_at": completed_at}
+
+        def fields(task):
+            if repeat_rule(task) is not None:
+                return occurrence_fields(task, completed)
+            return plain
+        return self.update_tasks(task_ids, fields, "Complete tasks" if completed else "Reopen tasks")
+
+    def delete_tasks(self, task_ids):
+        """Delete several tasks in one batch and return them"""
+        task_ids = set(task_ids)
+        # Archived tasks only need their segment rewritten
+        archived = []
+        for task_id in task_ids:
+            if task_id not in self.store:
+                task = self.archive.remove(task_id)
+                if task is not None:
+                    archived.append(task)
+
+        # Positions are needed to undo, take them before the tasks go
+        seqs = {task_id: self.store.seqs[task_id] for task_id in task_ids if task_id in self.store}
+        # One pass over the list rather than a list.remove per task
+        removed = self.store.remove_where(lambda task: task.id in task_ids)
+        if removed:
+            self.persist(*[{"op": "delete", "id": str(task.id)} for task in removed])
+        self.record_deletes(f"Delete {len(removed) + len(archived)} tasks", removed, seqs, archived)
+        return removed + archived
+
+    def clear_completed(self):
+        """Delete every completed task and return them"""
+        seqs = dict(zip((task.id for task in self.store.completed.tasks), self.store.completed.seqs))
+        removed = self.store.remove_where(lambda task: task.completed)
+        if removed:
+            self.persist(*[{"op": "delete", "id": str(task.id)} for task in removed])
+        self.record_deletes("Clear completed", removed, seqs)
+        return removed
+
+    def record_deletes(self, label, removed, seqs, archived=()):
+        tasks = list(removed) + list(archived)
+        if tasks:
+            forward = [("delete", task.id) for task in tasks]
+            inverse = [("add", seqs.get(task.id), task) for task in tasks]
+            self.history.push(label, forward, inverse)
+
+    @staticmethod
+    def old_fields(task, fields):
+        """The current values of the fields a change is about to set"""
+        data = task.to_dict()
+        return {key: data.get(key) for key in fields}
+
+    # Undo
+
+    def undo(self):
+        """Take back the last change.
+
+        Returns (label, ids of the tasks it touched), or None if there is
+        nothing to undo.
+        """
+        command = self.history.undo()
+        if command is None:
+            return None
+        label, forward, inverse = command
+        return label, self.apply_records(inverse)
+
+    def redo(self):
+        """Do the last undone change again, returns like undo()"""
+        command = self.history.redo()
+        if command is None:
+            return None
+        label, forward, inverse = command
+        return label, self.apply_records(forward)
+
+    def apply_records(self, records):
+        """Apply CommandLog records to the store and save them.
+
+        Only the tasks named in the records are touched; returns their ids.
+        """
+        saved = []
+        touched = []
+        put_back = []
+        deleted = set()
+        for record in records:
+            op = record[0]
+            if op == "add":
+                seq, task = record[1], record[2]
+                if task.id not in self.store:
+                    if seq is None:
+                        # Came from the archive, goes after every other task
+                        seq = self.store.next_seq + len(put_back)
+                    put_back.append((seq, task))
+                    saved.append({"op": "add", "task": task.to_dict()})
+                touched.append(task.id)
+            elif op == "update":
+                task_id, fields = record[1], record[2]
+                self.restore(task_id)
+                if self.store.update(task_id, fields) is not None:
+                    saved.append({"op": "update", "id": str(task_id), "fields": fields})
+                touched.append(task_id)
+            elif op == "delete":
+                task_id = record[1]
+                if task_id in self.store:
+                    deleted.add(task_id)
+                    saved.append({"op": "delete", "id": str(task_id)})
+                else:
+                    # Archived since, the segment is rewritten instead
+                    self.archive.remove(task_id)
+                touched.append(task_id)
+
+        if put_back:
+            self.store.put_back(put_back)
+        if len(deleted) == 1:
+            self.store.remove(next(iter(deleted)))
+        elif deleted:
+            self.store.remove_where(lambda task: task.id in deleted)
+        if saved:
+            self.persist(*saved)
+        return touched
+
+    def restore(self, task_id):
+        """Move an archived task back into the working set, returns it or None"""
+        if task_id in self.store:
+            return self.store.get(task_id)
+        task = self.archive.remove(task_id)
+        if task is not None:
+            self.store.add(task)
+            self.persist({"op": "add", "task": task.to_dict()})
+        return task
+
+    def archive_completed(self, max_age_days=ARCHIVE_AFTER_DAYS, today=None):
+        """Move tasks completed over max_age_days ago to the archive.
+
+        Only tasks with a completion time are archived. Returns the
+        archived tasks. Does nothing while loading.
+        """
+        if max_age_days is None or self.loading:
+            return []
+        cutoff = (today or date.today()) - timedelta(days=max_age_days)
+        old = []
+        for task in self.store.filtered("Completed"):
+            day = completed_day(task)
+            if day is not None and day < cutoff:
+                old.append(task)
+        if not old:
+            return []
+
+        # Segments are written before the deletes are saved, so a crash in
+        # between leaves a copy in both places rather than losing tasks
+        self.archive.add(old)
+        old_ids = {task.id for task in old}
+        self.store.remove_where(lambda task: task.id in old_ids)
+        self.persist(*[{"op": "delete", "id": str(task.id)} for task in old])
+        return old
+
+    def page_older_completed(self):
+        """Add the next older archive segment to the Completed filter.
+
+        Returns the number of tasks it added, 0 once the archive is paged in.
+        """
+        return self.archive.page_older()
+
+    # Changes by other processes
+
+    def sync_external_changes(self, force=False):
+        """Merge in changes another process saved to the storage.
+
+        The storage is only read when its files changed since this engine
+        last read or wrote them, and, unless force is set, the watcher saw
+        them change. Returns the ids of the added, changed and removed
+        tasks, or None if nothing changed.
+        """
+        if not self.external_changes_pending(force):
+            return None
+        try:
+            fresh = self.storage.load()
+        except Exception as e:
+            print(f"Error reading changed tasks: {e}")
+            return None
+        return self.merge(fresh)
+
+    def external_changes_pending(self, force=False):
+        """Whether the storage should be read for outside changes.
+
+        The checks of sync_external_changes; a True answer marks the files
+        as read, so the caller must go on to read and merge them.
+        """
+        # Our own writes still in flight would look like outside changes
+        if self.loading or self.snapshot_dirty or self.persistence.pending():
+            return False
+        if self.watcher is None:
+            self.watcher = StorageWatcher(self.storage.watched_files())
+        if not self.watcher.poll() and not force and not self.resync:
+            return False
+        if not self.storage.changed_since_sync() and not self.resync:
+            return False
+        self.resync = False
+        self.storage.mark_synced()
+        return True
+
+    async def read_external_changes(self):
+        """Read the storage for merge_read without blocking the caller.
+
+        For an AsyncRunner, after external_changes_pending said yes. Only
+        the storage is touched here, the store is left to merge_read.
+        """
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, self.storage.load)
+
+    def merge_read(self, fresh, revision):
+        """Merge tasks read by read_external_changes.
+
+        revision is self.revision from when the read began. If changes were
+        made here in the meantime the read is thrown away, as merging it
+        would undo them, and the storage is read again on the next check.
+        Returns like merge(), or None.
+        """
+        if revision != self.revision or self.loading:
+            self.resync = True
+            return None
+        return self.merge(fresh)
+
+    def merge(self, fresh):
+        """Bring the store in line with tasks read from storage.
+
+        Unlike a reload this keeps the Task objects, positions and indexes
+        of unchanged tasks; new tasks go to the end of the list. Tasks that
+        share an id with an earlier one get new ids, as on load.
+        """
+        seen = set()
+        added = []
+        changed = []
+        duplicates = []
+        for data in fresh:
+            task = Task.from_dict(data)
+            if task.id in seen:
+                duplicates.append(task)
+                continue
+            seen.add(task.id)
+            current = self.store.get(task.id)
+            if current is None:
+                self.store.add(task)
+                added.append(task.id)
+            else:
+                data = task.to_dict()
+                if current.to_dict() != data:
+                    # Keys removed outside must go here too
+                    self.store.replace(task.id, data)
+                    changed.append(task.id)
+
+        # Ids are handed out once every id in the file is known, so a
+        # duplicate cannot take the id of a task further down
+        for task in duplicates:
+            task.id = self.store.new_id(taken=seen)
+            seen.add(task.id)
+            self.store.add(task)
+            added.append(task.id)
+        self.store.renamed += len(duplicates)
+
+        removed = [task.id for task in self.store.tasks if task.id not in seen]
+        if removed:
+            removed_ids = set(removed)
+            self.store.remove_where(lambda task: task.id in removed_ids)
+        # The store now matches a complete read of the storage
+        self.load_error = None
+        self.save_renamed()
+        if added or changed or removed:
+            # The history no longer describes the tasks in the store
+            self.history.clear()
+        return added, changed, removed
+
+    # Persistence
+
+    def snapshot(self):
+        return [task.to_dict() for task in self.tasks]
+
+    def persist(self, *records):
+        """Save changes given as change records.
+
+        Backends that can only save the whole task list are marked for a
+        snapshot on the next commit() instead.
+        """
+        self.revision += 1
+        if self.storage.wants_snapshots:
+            self.snapshot_dirty = True
+        else:
+            self.persistence.submit("records", list(records))
+
+    def commit(self):
+        """Hand a pending snapshot to the writer.
+
+        Returns False while a streaming load is running, as a snapshot of a
+        half loaded list would drop the rest; try again later.
+        """
+        if not self.snapshot_dirty:
+            return True
+        if self.loading or not self.safe_to_save():
+            return False
+        self.snapshot_dirty = False
+        self.persistence.submit("snapshot", self.snapshot())
+        return True
+
+    def poll(self):
+        """Handle the writer's results and return its error messages"""
+        errors = []
+        while True:
+            try:
+                status, detail = self.persistence.results.get_nowait()
+            except queue.Empty:
+                break
+            if status == "error":
+                errors.append(detail)
+            elif status == "compact_needed" and not self.loading and self.safe_to_save():
+                # Asked again after the next write if still loading
+                self.persistence.submit("compact", self.snapshot())
+        return errors
+
+    def busy(self):
+        """Whether changes are waiting to be written or results to be polled"""
+        return (
+            (self.snapshot_dirty and self.safe_to_save())
+            or self.persistence.pending()
+            or not self.persistence.results.empty()
+        )
+
+    def flush(self):
+        """Block until every change so far is on disk"""
+        self.commit()
+        self.persistence.flush()
+
+    def close(self):
+        """Write out every change and release the storage"""
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.finish_loading()
+        self.commit()
+        self.persistence.stop()
+
+        # Leave a complete tasks file behind for other tools
+        if self.storage.has_changes() and self.safe_to_save():
+            try:
+                self.storage.compact(self.snapshot())
+            except Exception as e:
+                print(f"Error compacting task storage: {e}")
+        self.storage.close()
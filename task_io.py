@@ -0,0 +1,564 @@
+"""Bulk import and export of tasks: CSV, newline-delimited JSON and iCalendar.
+
+Readers take the lines of a file and yield tasks in the tasks.json layout
+one at a time; writers take them back the same way, so neither side ever
+holds a whole file. ImportJob and ExportJob do the work in time slices,
+like TaskEngine.load_some, so the TodoApp window stays responsive and can
+show progress. From the command line:
+
+    python task_io.py import old_tasks.csv
+    python task_io.py export tasks.ics --data-file tasks.json
+"""
+import os
+import csv
+import json
+import re
+import argparse
+import itertools
+import time
+from datetime import datetime, timezone
+
+from task_engine import STORAGE_MODE, Task, TaskEngine, occurrences, parse_iso
+
+IMPORT_CHUNK = 500  # Tasks added and saved together when importing
+EXPORT_CHUNK = 1000  # Tasks written between checks of the time slice
+
+# File types by extension, and the names used for them on the command line
+FORMATS = {
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".ics": "ical",
+}
+
+CSV_COLUMNS = ("id", "text", "completed", "date", "due_date", "extra")
+
+# Column names other tools use, lower cased, for the tasks.json keys
+CSV_ALIASES = {
+    "id": "id", "uid": "id",
+    "text": "text", "title": "text", "task": "text", "name": "text",
+    "summary": "text", "content": "text", "subject": "text",
+    "completed": "completed", "done": "completed", "status": "completed",
+    "date": "date", "created": "date", "created_at": "date", "created date": "date",
+    "due_date": "due_date", "due": "due_date", "due date": "due_date", "deadline": "due_date",
+    "completed_at": "completed_at", "completed date": "completed_at",
+    "extra": "extra",
+}
+TRUE_WORDS = {"1", "true", "yes", "y", "x", "done", "completed", "complete"}
+
+ICAL_FREQS = {"DAILY": ("day", 1), "WEEKLY": ("week", 1), "MONTHLY": ("month", 1), "YEARLY": ("month", 12)}
+ICAL_UNITS = {"day": "DAILY", "week": "WEEKLY", "month": "MONTHLY"}
+
+
+def format_for(path):
+    """The format of a file, by its extension"""
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported file type: {path} (use .csv, .ndjson, .jsonl or .ics)")
+    return fmt
+
+
+# Readers. Each yields one task dict per record, or None for a record that
+# could not be read, which ImportJob counts as failed.
+
+def read_csv(lines):
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    keys = [CSV_ALIASES.get(name.strip().lower()) for name in header]
+    if "text" not in keys:
+        # No header we know, read the first column as the task text
+        keys = ["text"] + [None] * (len(header) - 1)
+        yield csv_task(keys, header)
+    for row in reader:
+        if any(value.strip() for value in row):
+            yield csv_task(keys, row)
+
+
+def csv_task(keys, row):
+    task = {}
+    for key, value in zip(keys, row):
+        value = value.strip()
+        if key is None or not value:
+            continue
+        if key == "completed":
+            task[key] = value.lower() in TRUE_WORDS
+        elif key == "extra":
+            try:
+                extra = json.loads(value)
+            except ValueError:
+                return None
+            if isinstance(extra, dict):
+                for extra_key, extra_value in extra.items():
+                    task.setdefault(extra_key, extra_value)
+        elif key in ("date", "due_date", "completed_at"):
+            moment = parse_date(value)
+            task[key] = moment.isoformat() if moment else value
+        else:
+            task[key] = value
+    if not task.get("text"):
+        return None
+    return task
+
+
+def read_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            task = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield task if isinstance(task, dict) and task.get("text") else None
+
+
+def read_ical(lines):
+    """Yield the VTODOs of an iCalendar file; events and the rest are skipped"""
+    todo = None
+    depth = 0  # Components nested in the VTODO, e.g. a VALARM
+    for line in unfold(lines):
+        name, params, value = ical_property(line)
+        if name == "BEGIN":
+            if todo is not None:
+                depth += 1
+            elif value.upper() == "VTODO":
+                todo = {}
+        elif name == "END":
+            if todo is None:
+                continue
+            if depth:
+                depth -= 1
+            elif value.upper() == "VTODO":
+                yield ical_task(todo)
+                todo = None
+        elif todo is not None and not depth and name not in todo:
+            todo[name] = (params, value)
+
+
+def unfold(lines):
+    """Join iCalendar lines continued on the next line"""
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def ical_property(line):
+    """Split a content line into (NAME, {PARAM: value}, value)"""
+    i = line.find(":")
+    if i < 0:
+        return None, {}, ""
+    if '"' in line[:i]:
+        # A quoted parameter value may hold a colon, find the first one outside quotes
+        quoted = False
+        for i, char in enumerate(line):
+            if char == '"':
+                quoted = not quoted
+            elif char == ":" and not quoted:
+                break
+    head, value = line[:i], line[i + 1:]
+    if ";" not in head:
+        return head.upper(), {}, value
+    name, *params = head.split(";")
+    params = dict(param.split("=", 1) for param in params if "=" in param)
+    return name.upper(), {key.upper(): value for key, value in params.items()}, value
+
+
+def ical_task(props):
+    text = ical_unescape(props.get("SUMMARY", ({}, ""))[1]).strip()
+    if not text:
+        return None
+    task = {"text": text}
+    if "UID" in props:
+        task["id"] = props["UID"][1]
+    status = props.get("STATUS", ({}, ""))[1].upper()
+    task["completed"] = status == "COMPLETED" or "COMPLETED" in props
+    for name, key in (("CREATED", "date"), ("DTSTAMP", "date"), ("DUE", "due_date"),
+                      ("DTSTART", "due_date"), ("COMPLETED", "completed_at")):
+        if name in props and key not in task:
+            moment = parse_ical_date(props[name][1])
+            if moment is not None:
+                task[key] = moment.isoformat()
+    if "RRULE" in props and "due_date" in task:
+        repeat = ical_repeat(props["RRULE"][1], task["due_date"])
+        if repeat:
+            task["repeat"] = repeat
+    if "DESCRIPTION" in props:
+        task["notes"] = ical_unescape(props["DESCRIPTION"][1])
+    return task
+
+
+def ical_repeat(rrule, due_date):
+    """A repeat rule from an RRULE, or None for rules we cannot follow.
+
+    COUNT becomes an until on the day of the last occurrence, counted from
+    the ISO due_date the series starts at.
+    """
+    parts = dict(part.split("=", 1) for part in rrule.upper().split(";") if "=" in part)
+    if parts.get("FREQ") not in ICAL_FREQS:
+        return None
+    unit, months = ICAL_FREQS[parts["FREQ"]]
+    try:
+        interval = int(parts.get("INTERVAL", "1")) * months
+    except ValueError:
+        return None
+    repeat = {"every": unit}
+    if interval != 1:
+        repeat["interval"] = interval
+    if "UNTIL" in parts:
+        until = parse_ical_date(parts["UNTIL"])
+        if until is not None:
+            repeat["until"] = until.date().isoformat()
+    if "COUNT" in parts:
+        try:
+            count = int(parts["COUNT"])
+        except ValueError:
+            return None
+        if count < 1:
+            return None
+        series = Task.from_dict({"due_date": due_date, "repeat": repeat})
+        last = next(itertools.islice(occurrences(series), count - 1, None), None)
+        if last is not None:
+            # An UNTIL as well would be against the spec, the earlier end wins
+            repeat["until"] = last[0].isoformat()
+    return repeat
+
+
+ICAL_ESCAPE_RE = re.compile(r"\\(.)")
+
+
+def ical_unescape(value):
+    if "\\" not in value:
+        return value
+    return ICAL_ESCAPE_RE.sub(lambda match: "\n" if match.group(1) in "nN" else match.group(1), value)
+
+
+def ical_escape(value):
+    return (value.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def parse_ical_date(value):
+    """A DATE or DATE-TIME value as a local datetime without a time zone, or None"""
+    value = value.strip()
+    # Sliced by hand, strptime is several times slower on big imports
+    try:
+        if len(value) == 8:
+            return datetime(int(value[:4]), int(value[4:6]), int(value[6:8]))
+        if len(value) not in (15, 16) or value[8] != "T":
+            return None
+        moment = datetime(int(value[:4]), int(value[4:6]), int(value[6:8]),
+                          int(value[9:11]), int(value[11:13]), int(value[13:15]))
+    except ValueError:
+        return None
+    if value.endswith("Z"):
+        return moment.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return moment
+
+
+def ical_date(moment):
+    """A DATE-TIME value, in UTC with a Z when moment has a time zone, else floating"""
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return moment.strftime("%Y%m%dT%H%M%S")
+
+
+def parse_date(value):
+    """A date from a CSV cell, ISO or one of a few common layouts, or None"""
+    moment = parse_iso(value)
+    if moment is not None:
+        return moment
+    for layout in ("%m/%d/%Y", "%m/%d/%Y %H:%M", "%d.%m.%Y", "%Y%m%d"):
+        try:
+            return datetime.strptime(value, layout)
+        except ValueError:
+            continue
+    return None
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson, "ical": read_ical}
+
+
+# Writers, with begin, write (one task dict at a time) and end
+
+class CsvWriter:
+    def __init__(self, f):
+        self.writer = csv.writer(f)
+
+    def begin(self):
+        self.writer.writerow(CSV_COLUMNS)
+
+    def write(self, task):
+        extra = {key: value for key, value in task.items() if key not in CSV_COLUMNS}
+        self.writer.writerow([
+            task.get("id", ""),
+            task.get("text", ""),
+            "true" if task.get("completed") else "false",
+            task.get("date") or "",
+            task.get("due_date") or "",
+            json.dumps(extra) if extra else "",
+        ])
+
+    def end(self):
+        pass
+
+
+class NdjsonWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def begin(self):
+        pass
+
+    def write(self, task):
+        self.f.write(json.dumps(task) + "\n")
+
+    def end(self):
+        pass
+
+
+class IcalWriter:
+    def __init__(self, f):
+        self.f = f
+        self.stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    def line(self, text):
+        # Lines are folded at 75 characters, continuations start with a space
+        while len(text) > 75:
+            self.f.write(text[:75] + "\r\n")
+            text = " " + text[75:]
+        self.f.write(text + "\r\n")
+
+    def begin(self):
+        self.line("BEGIN:VCALENDAR")
+        self.line("VERSION:2.0")
+        self.line("PRODID:-//TODO App//Tasks//EN")
+
+    def write(self, task):
+        self.line("BEGIN:VTODO")
+        self.line(f"UID:{task.get('id', '')}")
+        self.line(f"DTSTAMP:{self.stamp}")
+        self.line(f"SUMMARY:{ical_escape(task.get('text', ''))}")
+        for key, name in (("date", "CREATED"), ("due_date", "DUE"), ("completed_at", "COMPLETED")):
+            moment = parse_iso(task.get(key))
+            if moment is not None:
+                self.line(f"{name}:{ical_date(moment)}")
+        self.line("STATUS:" + ("COMPLETED" if task.get("completed") else "NEEDS-ACTION"))
+        repeat = task.get("repeat")
+        if isinstance(repeat, dict) and repeat.get("every") in ICAL_UNITS:
+            rrule = f"RRULE:FREQ={ICAL_UNITS[repeat['every']]}"
+            if repeat.get("interval", 1) != 1:
+                rrule += f";INTERVAL={repeat['interval']}"
+            until = parse_iso(repeat.get("until"))
+            due = parse_iso(task.get("due_date"))
+            if until is not None and due is not None:
+                # UNTIL has to be the same type as DUE, a DATE-TIME, so it is
+                # the end of the last local day, in UTC when DUE is
+                until = until.replace(hour=23, minute=59, second=59, tzinfo=None)
+                if due.tzinfo is not None:
+                    until = until.astimezone()
+                rrule += f";UNTIL={ical_date(until)}"
+            self.line(rrule)
+        if task.get("notes"):
+            self.line(f"DESCRIPTION:{ical_escape(str(task['notes']))}")
+        self.line("END:VTODO")
+
+    def end(self):
+        self.line("END:VCALENDAR")
+
+
+WRITERS = {"csv": CsvWriter, "ndjson": NdjsonWriter, "ical": IcalWriter}
+
+
+class ImportJob:
+    """Imports a file into a TaskEngine a slice at a time:
+
+        job = ImportJob(engine, "old_tasks.csv")
+        while not job.run_some(0.03):
+            print(job.progress())
+
+    Records are read one at a time and added in batches of chunk_size,
+    each saved as one write through the engine's storage; the whole
+    import is undone in one step. Records whose id is already taken, by a
+    task in the list or the archive or earlier in the file, are skipped.
+    """
+
+    def __init__(self, engine, path, fmt=None, chunk_size=IMPORT_CHUNK):
+        self.engine = engine
+        self.path = path
+        self.fmt = fmt or format_for(path)
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        self.read = 0  # Characters read so far, for progress
+        # utf-8-sig drops the byte order mark spreadsheets put in CSV files
+        self.file = open(path, "r", encoding="utf-8-sig", newline="")
+        self.records = READERS[self.fmt](self.counted_lines())
+        self.archived_ids = None
+        self.pending = []  # Records read for the next batch
+        self.added = 0
+        self.skipped = 0
+        self.failed = 0
+        self.batches = 0
+        self.done = False
+
+    def counted_lines(self):
+        for line in self.file:
+            self.read += len(line)
+            yield line
+
+    def run_some(self, seconds=None):
+        """Import for about the given time, returns True once done"""
+        if self.done:
+            return True
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        if self.archived_ids is None:
+            # Archived tasks are not in the store, collect their ids once
+            self.archived_ids = {str(task.get("id")) for task in self.engine.archive.iter_tasks()}
+        pending = self.pending
+        for task in self.records:
+            pending.append(task)
+            if len(pending) >= self.chunk_size:
+                self.add_batch(pending)
+                pending.clear()
+            if deadline is not None and len(pending) % 100 == 0 and time.perf_counter() >= deadline:
+                return False
+        self.add_batch(pending)
+        pending.clear()
+        self.close()
+        return True
+
+    def add_batch(self, batch):
+        tasks = []
+        now = datetime.now().isoformat()
+        for task in batch:
+            if task is None:
+                self.failed += 1
+            elif task.get("id") is not None and str(task["id"]) in self.archived_ids:
+                self.skipped += 1
+            else:
+                # Tools that keep no creation date get the time of the import
+                if not task.get("date"):
+                    task["date"] = now
+                tasks.append(task)
+        if not tasks:
+            return
+        label = f"Import {os.path.basename(self.path)}"
+        added = self.engine.add_tasks(tasks, label, merge=self.batches > 0)
+        self.batches += 1
+        self.added += len(added)
+        self.skipped += len(tasks) - len(added)
+
+    def progress(self):
+        """How far the import is, from 0 to 1"""
+        if self.done or not self.size:
+            return 1.0
+        return min(self.read / self.size, 1.0)
+
+    def close(self):
+        self.done = True
+        self.file.close()
+
+    def cancel(self):
+        """Stop reading; the tasks added so far stay"""
+        self.close()
+
+
+class ExportJob:
+    """Writes the tasks of a TaskEngine to a file a slice at a time.
+
+    The tasks in the list when the job starts are written, then the
+    archived ones unless include_archived is off. The file is written
+    next to its destination and moved into place once complete.
+    """
+
+    def __init__(self, engine, path, fmt=None, include_archived=True, chunk_size=EXPORT_CHUNK):
+        self.path = path
+        self.fmt = fmt or format_for(path)
+        self.chunk_size = chunk_size
+        self.total = len(engine)
+        self.written = 0
+        self.temp_path = path + ".tmp"
+        self.file = open(self.temp_path, "w", encoding="utf-8", newline="")
+        self.writer = WRITERS[self.fmt](self.file)
+        self.writer.begin()
+        tasks = (task.to_dict() for task in list(engine.tasks))
+        if include_archived:
+            # A crash while archiving can leave a task in both places
+            archived = (task for task in engine.archive.iter_tasks()
+                        if Task.parse_id(task.get("id")) not in engine.store)
+            tasks = itertools.chain(tasks, archived)
+        self.tasks = tasks
+        self.done = False
+
+    def run_some(self, seconds=None):
+        """Write for about the given time, returns True once done"""
+        if self.done:
+            return True
+        deadline = None if seconds is None else time.perf_counter() + seconds
+        while deadline is None or time.perf_counter() < deadline:
+            count = 0
+            for task in itertools.islice(self.tasks, self.chunk_size):
+                self.writer.write(task)
+                count += 1
+            self.written += count
+            if count < self.chunk_size:
+                self.finish()
+                return True
+        return False
+
+    def progress(self):
+        if self.done or not self.total:
+            return 1.0
+        return min(self.written / self.total, 1.0)
+
+    def finish(self):
+        self.writer.end()
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+        self.done = True
+
+    def cancel(self):
+        if not self.done:
+            self.file.close()
+            os.remove(self.temp_path)
+            self.done = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="a .csv, .ndjson, .jsonl or .ics file")
+    parser.add_argument("--data-file", default="tasks.json", help="the app's tasks file")
+    parser.add_argument("--storage", default=STORAGE_MODE, help="the app's storage mode")
+    parser.add_argument("--no-archived", action="store_true", help="leave archived tasks out of an export")
+    args = parser.parse_args(argv)
+
+    engine = TaskEngine(args.data_file, args.storage)
+    engine.load()
+    try:
+        started = time.perf_counter()
+        if args.command == "import":
+            job = ImportJob(engine, args.path)
+            job.run_some()
+            print(f"Imported {job.added} tasks, skipped {job.skipped} already there, "
+                  f"{job.failed} unreadable ({time.perf_counter() - started:.2f}s)")
+        else:
+            job = ExportJob(engine, args.path, include_archived=not args.no_archived)
+            job.run_some()
+            print(f"Exported {job.written} tasks to {args.path} ({time.perf_counter() - started:.2f}s)")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
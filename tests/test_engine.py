@@ -0,0 +1,177 @@
+"""TaskEngine without a window: streaming reads, undo and redo, merging"""
+import io
+import json
+
+import pytest
+
+from task_engine import TaskEngine, iter_json_array
+
+STORAGE_MODES = ["json", "journal", "sqlite"]
+
+
+def open_engine(tmp_path, mode="journal"):
+    engine = TaskEngine(str(tmp_path / "tasks.json"), mode, background=False)
+    engine.load()
+    return engine
+
+
+def texts(engine):
+    return [task.text for task in engine.tasks]
+
+
+# iter_json_array
+
+ARRAY = [{"id": 1, "text": "a, [b]", "extra": {"n": [1, 2.5e3]}}, -12, 3.25, "x", True, None, [], {}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_iter_json_array_reads_values_split_across_chunks(chunk_size):
+    text = json.dumps(ARRAY, indent=1)
+    assert list(iter_json_array(io.StringIO(text), chunk_size)) == ARRAY
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4])
+def test_iter_json_array_reads_whole_numbers_across_chunks(chunk_size):
+    # A number cut at a chunk boundary parses on its own, it must not be
+    # yielded before the rest of it is read
+    assert list(iter_json_array(io.StringIO("[12345,-6.78e+9, 100]"), chunk_size)) == [12345, -6.78e9, 100]
+
+
+@pytest.mark.parametrize("text", ["", "  \n", "[]", " [ ] "])
+def test_iter_json_array_empty(text):
+    assert list(iter_json_array(io.StringIO(text), 2)) == []
+
+
+@pytest.mark.parametrize("text", [
+    '{"id": 1}',
+    "[1 2]",
+    "[1,,2]",
+    "[,1]",
+    "[1,]",
+    "[1] 2",
+    "[1, 2",
+    '[{"id": 1}',
+    '[{"id": ',
+])
+@pytest.mark.parametrize("chunk_size", [1, 3, 64])
+def test_iter_json_array_rejects_malformed_input(text, chunk_size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), chunk_size))
+
+
+def test_failed_load_is_never_saved(tmp_path):
+    data_file = tmp_path / "tasks.json"
+    text = '[{"id": 1, "text": "one"}, {"id": 2, "text": "two"} {"id": 3}]'
+    data_file.write_text(text)
+    engine = TaskEngine(str(data_file), "json", background=False)
+    engine.start_loading()
+    engine.finish_loading()
+    assert engine.load_error is not None
+    assert texts(engine) == ["one", "two"]
+
+    engine.add_task("three")
+    engine.close()
+    assert data_file.read_text() == text
+
+
+# Undo and redo
+
+@pytest.mark.parametrize("mode", STORAGE_MODES)
+def test_undo_and_redo_bulk_changes(tmp_path, mode):
+    engine = open_engine(tmp_path, mode)
+    engine.add_tasks([{"text": f"task {i}"} for i in range(5)])
+    ids = [task.id for task in engine.tasks]
+
+    engine.set_completed(ids[:3], True)
+    engine.update_tasks(ids[1:4], {"text": "renamed"})
+    engine.delete_tasks([ids[0], ids[2]])
+    assert texts(engine) == ["renamed", "renamed", "task 4"]
+
+    assert engine.undo()[0] == "Delete 2 tasks"
+    # Deleted tasks go back to where they were
+    assert [task.id for task in engine.tasks] == ids
+    assert engine.undo()[0] == "Edit 3 tasks"
+    assert texts(engine) == [f"task {i}" for i in range(5)]
+    assert engine.undo()[0] == "Complete tasks"
+    assert not any(task.completed for task in engine.tasks)
+
+    engine.redo()
+    engine.redo()
+    assert [task.completed for task in engine.tasks] == [True, True, True, False, False]
+    assert texts(engine) == ["task 0", "renamed", "renamed", "renamed", "task 4"]
+    engine.close()
+
+    reopened = open_engine(tmp_path, mode)
+    assert [task.id for task in reopened.tasks] == ids
+    assert texts(reopened) == ["task 0", "renamed", "renamed", "renamed", "task 4"]
+    reopened.close()
+
+
+def test_undo_an_import_and_clear_completed(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.add_task("kept")
+    engine.add_tasks([{"text": "a"}, {"text": "b"}], "Import")
+    # Later batches of the same import are undone with the first
+    engine.add_tasks([{"text": "c"}], "Import", merge=True)
+    engine.set_completed([task.id for task in engine.tasks[1:3]], True)
+    engine.clear_completed()
+    assert texts(engine) == ["kept", "c"]
+
+    engine.undo()
+    assert texts(engine) == ["kept", "a", "b", "c"]
+    engine.undo()
+    assert engine.undo()[0] == "Import"
+    assert texts(engine) == ["kept"]
+    assert engine.redo()[0] == "Import"
+    assert texts(engine) == ["kept", "a", "b", "c"]
+
+    # A new change drops what could be redone
+    engine.add_task("new")
+    assert engine.redo() is None
+
+
+# Merging outside changes
+
+def test_merge_added_removed_and_changed(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.add_tasks([
+        {"id": 1, "text": "unchanged"},
+        {"id": 2, "text": "renamed outside"},
+        {"id": 3, "text": "loses its notes", "notes": "gone"},
+        {"id": 4, "text": "removed outside"},
+    ])
+    unchanged = engine.get(1)
+    fresh = [task.to_dict() for task in engine.tasks]
+    fresh[1]["text"] = "renamed"
+    del fresh[2]["notes"]
+    del fresh[3]
+    fresh.append({"id": 5, "text": "added outside"})
+
+    added, changed, removed = engine.merge(fresh)
+    assert (added, sorted(changed), removed) == ([5], [2, 3], [4])
+    assert texts(engine) == ["unchanged", "renamed", "loses its notes", "added outside"]
+    assert "notes" not in engine.get(3).to_dict()
+    # Unchanged tasks keep their objects
+    assert engine.get(1) is unchanged
+    assert engine.search("renamed") == [engine.get(2)]
+    # The history described the old tasks
+    assert engine.undo() is None
+
+    assert engine.merge([task.to_dict() for task in engine.tasks]) == ([], [], [])
+
+
+def test_merge_renames_duplicate_ids(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.add_tasks([{"id": 1, "text": "one"}])
+    added, changed, removed = engine.merge([
+        {"id": 1, "text": "one"},
+        {"id": 1, "text": "copy of one"},
+        {"id": 2, "text": "two"},
+    ])
+    assert changed == [] and removed == []
+    assert len(set(task.id for task in engine.tasks)) == 3
+    assert texts(engine) == ["one", "two", "copy of one"]
+
+    # The new id is saved, so the next load hands out the same one
+    reopened = open_engine(tmp_path)
+    assert [task.id for task in reopened.tasks] == [task.id for task in engine.tasks]
@@ -0,0 +1,109 @@
+"""Journal storage: replaying the change log, compaction and crashes"""
+import json
+import os
+
+from task_engine import JournalStorage, TaskEngine
+
+
+def open_engine(tmp_path):
+    engine = TaskEngine(str(tmp_path / "tasks.json"), "journal", background=False)
+    engine.load()
+    return engine
+
+
+def texts(engine):
+    return [task.text for task in engine.tasks]
+
+
+def test_changes_are_appended_and_replayed(tmp_path):
+    engine = open_engine(tmp_path)
+    first = engine.add_task("first")
+    second = engine.add_task("second")
+    engine.add_task("third")
+    engine.update_task(first.id, {"text": "first, edited"})
+    engine.toggle_task(second.id, True)
+    engine.delete_task(second.id)
+
+    # Nothing but the log has been written so far
+    assert not os.path.exists(engine.data_file)
+    with open(engine.storage.journal_file) as f:
+        ops = [json.loads(line)["op"] for line in f]
+    assert ops == ["add", "add", "add", "update", "update", "delete"]
+
+    # Left without close(), as after a crash
+    reopened = open_engine(tmp_path)
+    assert texts(reopened) == ["first, edited", "third"]
+
+
+def test_replay_matches_string_and_number_ids(tmp_path):
+    data_file = tmp_path / "tasks.json"
+    data_file.write_text(json.dumps([{"id": 7, "text": "seven"}]))
+    with open(str(data_file) + ".journal", "w") as f:
+        f.write(json.dumps({"op": "update", "id": "7", "fields": {"text": "edited"}}) + "\n")
+    assert [task["text"] for task in JournalStorage(str(data_file)).load()] == ["edited"]
+
+
+def test_compaction_folds_the_log_into_the_snapshot(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.storage.compact_bytes = 200
+    for i in range(20):
+        engine.add_task(f"task {i}")
+    assert engine.storage.needs_compaction()
+    engine.poll()
+
+    assert not engine.storage.has_changes()
+    with open(engine.data_file) as f:
+        assert [task["text"] for task in json.load(f)] == [f"task {i}" for i in range(20)]
+
+    # Later changes go to a new log on top of the new snapshot
+    engine.delete_task(engine.tasks[0].id)
+    assert engine.storage.has_changes()
+    assert texts(open_engine(tmp_path)) == [f"task {i}" for i in range(1, 20)]
+
+
+def test_interrupted_compaction_keeps_both_logs(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.add_task("before")
+    # A compaction that moved the log aside and then died
+    os.replace(engine.storage.journal_file, engine.storage.compacting_file)
+    engine.add_task("after")
+    assert texts(open_engine(tmp_path)) == ["before", "after"]
+
+    engine.storage.compact(engine.snapshot())
+    assert not os.path.exists(engine.storage.compacting_file)
+    assert texts(open_engine(tmp_path)) == ["before", "after"]
+
+
+def test_torn_trailing_record_is_ignored(tmp_path):
+    engine = open_engine(tmp_path)
+    kept = engine.add_task("kept")
+    engine.add_task("also kept")
+    # A crash half way through appending the next record
+    with open(engine.storage.journal_file, "a") as f:
+        f.write('{"op": "update", "id": "%s", "fields": {"text": "lo' % kept.id)
+
+    reopened = open_engine(tmp_path)
+    assert reopened.load_error is None
+    assert texts(reopened) == ["kept", "also kept"]
+
+
+def test_close_leaves_a_complete_snapshot(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.add_task("one")
+    engine.add_task("two")
+    engine.close()
+
+    assert not os.path.exists(str(tmp_path / "tasks.json.journal"))
+    with open(tmp_path / "tasks.json") as f:
+        assert [task["text"] for task in json.load(f)] == ["one", "two"]
+
+
+def test_changes_after_a_torn_record_are_kept(tmp_path):
+    engine = open_engine(tmp_path)
+    engine.add_task("kept")
+    with open(engine.storage.journal_file, "a") as f:
+        f.write('{"op": "add", "task": {"id": "x", "te')
+
+    reopened = open_engine(tmp_path)
+    reopened.add_task("added after the crash")
+    assert texts(open_engine(tmp_path)) == ["kept", "added after the crash"]
@@ -0,0 +1,135 @@
+"""Import and export round trips through CSV, NDJSON and iCalendar"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from task_engine import Task, TaskEngine
+from task_io import ExportJob, ImportJob, ical_repeat, read_ical
+
+TASKS = [
+    {"id": 1, "text": "Plain", "completed": False, "date": "2025-01-02T08:30:00"},
+    {"id": 2, "text": 'Commas, "quotes"; and\nnew lines', "completed": True,
+     "date": "2025-01-03T09:00:00", "completed_at": "2025-01-04T10:15:00"},
+    {"id": 3, "text": "Due with notes", "completed": False, "date": "2025-01-05T00:00:00",
+     "due_date": "2025-02-01T17:00:00", "notes": "line one\nline two"},
+    {"id": 4, "text": "Every other week", "completed": False, "date": "2025-01-06T00:00:00",
+     "due_date": "2025-01-06T09:00:00", "repeat": {"every": "week", "interval": 2, "until": "2025-06-30"}},
+]
+# As the engine gives them back, e.g. ids as strings
+EXPECTED = [Task.from_dict(task).to_dict() for task in TASKS]
+
+
+def open_engine(tmp_path, name):
+    engine = TaskEngine(str(tmp_path / name / "tasks.json"), "journal", background=False)
+    (tmp_path / name).mkdir()
+    engine.load()
+    return engine
+
+
+def export(engine, path):
+    job = ExportJob(engine, str(path))
+    assert job.run_some()
+    return job
+
+
+def import_file(engine, path, chunk_size=2):
+    job = ImportJob(engine, str(path), chunk_size=chunk_size)
+    assert job.run_some()
+    return job
+
+
+@pytest.mark.parametrize("name", ["tasks.csv", "tasks.ndjson", "tasks.ics"])
+def test_round_trip(tmp_path, name):
+    source = open_engine(tmp_path, "source")
+    source.add_tasks(TASKS)
+    assert export(source, tmp_path / name).written == len(TASKS)
+
+    target = open_engine(tmp_path, "target")
+    job = import_file(target, tmp_path / name)
+    assert (job.added, job.skipped, job.failed) == (len(TASKS), 0, 0)
+    assert [task.to_dict() for task in target.tasks] == EXPECTED
+
+    # Importing the same file again finds every id taken
+    job = import_file(target, tmp_path / name)
+    assert (job.added, job.skipped) == (0, len(TASKS))
+
+    # The import is undone in one step, however many batches it took
+    assert target.undo()[0] == f"Import {name}"
+    assert len(target) == 0
+
+
+def test_export_includes_archived_tasks(tmp_path):
+    engine = open_engine(tmp_path, "source")
+    engine.add_tasks(TASKS)
+    assert len(engine.archive_completed(30, datetime(2025, 6, 1).date())) == 1
+    export(engine, tmp_path / "tasks.ndjson")
+
+    target = open_engine(tmp_path, "target")
+    import_file(target, tmp_path / "tasks.ndjson")
+    assert sorted(task.id for task in target.tasks) == [1, 2, 3, 4]
+
+
+def test_unreadable_records_are_counted(tmp_path):
+    path = tmp_path / "tasks.ndjson"
+    path.write_text('{"text": "good"}\nnot json\n{"id": 5}\n\n{"text": "also good"}\n')
+    engine = open_engine(tmp_path, "target")
+    job = import_file(engine, path)
+    assert (job.added, job.failed) == (2, 2)
+    assert [task.text for task in engine.tasks] == ["good", "also good"]
+
+
+def test_csv_from_other_tools(tmp_path):
+    path = tmp_path / "tasks.csv"
+    path.write_text("\ufeffTitle,Status,Due Date\nBuy milk,,05/01/2025\nCall mum,done,2025-05-02\n",
+                    encoding="utf-8")
+    engine = open_engine(tmp_path, "target")
+    import_file(engine, path)
+    assert [(task.text, task.completed, task.due) for task in engine.tasks] == [
+        ("Buy milk", False, datetime(2025, 5, 1)),
+        ("Call mum", True, datetime(2025, 5, 2)),
+    ]
+
+
+def test_ical_writes_aware_dates_in_utc(tmp_path):
+    due = datetime(2025, 3, 1, 9, 0, tzinfo=timezone(timedelta(hours=2)))
+    engine = open_engine(tmp_path, "source")
+    engine.add_tasks([{"id": 1, "text": "Aware", "due_date": due.isoformat(),
+                       "repeat": {"every": "day", "until": "2025-03-05"}}])
+    export(engine, tmp_path / "tasks.ics")
+    text = (tmp_path / "tasks.ics").read_text()
+    assert "DUE:20250301T070000Z" in text
+    # UNTIL is a DATE-TIME in UTC like DUE, at the end of the last local day
+    until = datetime(2025, 3, 5, 23, 59, 59).astimezone().astimezone(timezone.utc)
+    assert f"UNTIL={until.strftime('%Y%m%dT%H%M%SZ')}" in text
+
+    (task,) = read_ical(text.splitlines(True))
+    assert datetime.fromisoformat(task["due_date"]) == due.astimezone().replace(tzinfo=None)
+    assert task["repeat"] == {"every": "day", "until": "2025-03-05"}
+
+
+def test_ical_floating_dates_stay_floating(tmp_path):
+    engine = open_engine(tmp_path, "source")
+    engine.add_tasks([TASKS[3]])
+    export(engine, tmp_path / "tasks.ics")
+    text = (tmp_path / "tasks.ics").read_text()
+    assert "DUE:20250106T090000\n" in text
+    assert "RRULE:FREQ=WEEKLY;INTERVAL=2;UNTIL=20250630T235959\n" in text
+
+
+@pytest.mark.parametrize("rrule, until", [
+    ("FREQ=DAILY;COUNT=1", "2025-01-31"),
+    ("FREQ=WEEKLY;COUNT=3", "2025-02-14"),
+    ("FREQ=MONTHLY;COUNT=2", "2025-02-28"),
+    ("FREQ=YEARLY;COUNT=2", "2026-01-31"),
+    ("FREQ=DAILY;INTERVAL=2;COUNT=3", "2025-02-04"),
+    # Both is against the spec, the earlier end wins
+    ("FREQ=DAILY;COUNT=10;UNTIL=20250202", "2025-02-02"),
+    ("FREQ=DAILY;COUNT=2;UNTIL=20250210", "2025-02-01"),
+])
+def test_ical_count_becomes_until(rrule, until):
+    assert ical_repeat(rrule, "2025-01-31T09:00:00")["until"] == until
+
+
+@pytest.mark.parametrize("rrule", ["FREQ=DAILY;COUNT=0", "FREQ=DAILY;COUNT=x", "FREQ=HOURLY"])
+def test_ical_rules_we_cannot_follow(rrule):
+    assert ical_repeat(rrule, "2025-01-31T09:00:00") is None
@@ -1,21 +1,301 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Cold start is timed from here
+
 import os
 import json
 import tkinter as tk
 import customtkinter as ctk
 from datetime import datetime
-from tkinter import messagebox
-from PIL import Image, ImageTk
-from tkcalendar import Calendar
-import time
+from tkinter import filedialog, messagebox
+from task_engine import (
+    ARCHIVE_AFTER_DAYS,
+    DATE_FORMAT,
+    STORAGE_MODE,
+    AsyncRunner,
+    TaskEngine,
+    format_day,
+    invalidate_date_cache,
+    next_due,
+    parse_iso,
+    repeat_rule,
+)
+# tkcalendar is only needed once a calendar is shown, and task_io (with csv
+# and argparse) only on import or export, so they are imported there
+
+IMPORTS_DONE = time.perf_counter()
 
 # Set appearance mode and default theme
 ctk.set_appearance_mode("System")  # Modes: "System" (standard), "Dark", "Light"
 ctk.set_default_color_theme("blue")  # Themes: "blue" (standard), "green", "dark-blue"
 
+# Task row colors
+ROW_COLOR = ("gray90", "gray20")
+ROW_SELECTED_COLOR = ("gray75", "gray30")
+
+# Lists longer than this are shown in the virtual (windowed) list, which only
+# keeps enough row widgets to fill the viewport and rebinds them on scroll
+VIRTUAL_LIST_THRESHOLD = 200
+VIRTUAL_ROW_HEIGHT = 64  # Fixed height of a pooled row, padding excluded
+VIRTUAL_ROW_PADDING = 5
+
+PERSIST_POLL_MS = 100  # How often to check on the persistence worker
+ASYNC_POLL_MS = 20  # How often to collect results of asyncio jobs while any run
+
+# Tasks are read in slices of at most LOAD_SLICE_MS so the window stays
+# responsive and shows the first tasks while a large file is still loading
+LOAD_SLICE_MS = 30
+
+# Modifier bits of Tk event.state, for shift and ctrl clicks
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+SEARCH_DEBOUNCE_MS = 150  # Search once typing pauses for this long
+
+# How often to look for changes other processes made to the task files.
+# A check is a few stats, or nothing at all when watchdog is installed
+EXTERNAL_CHECK_MS = 2000
+
+# One timer is armed for the next task to come due. It wakes at least this
+# often anyway, so a changed clock or a suspended laptop cannot make it late
+REMINDER_MAX_WAIT_MS = 60_000
+REMINDER_SHOW_MS = 15_000  # How long a due reminder stays up
+
+# Choices of the Date format menu, named by how Dec 31, 2025 looks in them.
+# The first one is DATE_FORMAT, the format shown at startup
+DATE_FORMAT_CHOICES = {
+    "Dec 31, 2025": DATE_FORMAT,
+    "31/12/2025": "%d/%m/%Y",
+    "12/31/2025": "%m/%d/%Y",
+    "2025-12-31": "%Y-%m-%d",
+}
+
+# Choices of the Repeat menu next to Set Due Date, as repeat rules for
+# TaskEngine.add_task. Any other interval or an end date can be set in tasks.json
+REPEAT_CHOICES = {
+    "Does not repeat": None,
+    "Daily": {"every": "day"},
+    "Weekly": {"every": "week"},
+    "Every 2 weeks": {"every": "week", "interval": 2},
+    "Monthly": {"every": "month"},
+}
+REPEAT_NAMES = {"day": "Daily", "week": "Weekly", "month": "Monthly"}
+
+
+def describe_repeat(rule):
+    """Short text for a repeat_rule, e.g. Every 2 weeks until Dec 31"""
+    unit, interval, until = rule
+    text = REPEAT_NAMES[unit] if interval == 1 else f"Every {interval} {unit}s"
+    if until:
+        text += f" until {format_day(until, '%b %d')}"
+    return text
+
+
+# File types offered by Import and Export, see task_io
+IO_FILETYPES = [
+    ("CSV", "*.csv"),
+    ("Newline-delimited JSON", "*.ndjson *.jsonl"),
+    ("iCalendar", "*.ics"),
+]
+
+# Startup timings are always printed; set TODO_STARTUP_REPORT to a file name
+# to also get them as JSON, and TODO_EXIT_AFTER_STARTUP=1 to close the app
+# once started (used by benchmarks/bench_startup.py)
+STARTUP_REPORT_FILE = os.environ.get("TODO_STARTUP_REPORT")
+EXIT_AFTER_STARTUP = os.environ.get("TODO_EXIT_AFTER_STARTUP") == "1"
+
+
+class TaskRow:
+    """The widgets that display one task in the task list.
+
+    A row can be rebound to a different task with bind_task, which lets the
+    virtual list reuse a small pool of rows for any number of tasks.
+    """
+
+    def __init__(self, app, parent, fixed_height=None):
+        self.app = app
+        self.task_id = None
+
+        if fixed_height:
+            self.frame = ctk.CTkFrame(parent, corner_radius=6, fg_color=ROW_COLOR, height=fixed_height)
+            self.frame.grid_propagate(False)
+        else:
+            self.frame = ctk.CTkFrame(parent, corner_radius=6, fg_color=ROW_COLOR)
+        self.frame.grid_columnconfigure(1, weight=1)
+        self.frame.bind("<Button-1>", self.on_click)
+
+        # Checkbox for task completion
+        self.check_var = tk.BooleanVar(value=False)
+        self.checkbox = ctk.CTkCheckBox(
+            self.frame,
+            text="",
+            variable=self.check_var,
+            command=self.on_check,
+            width=20,
+            checkbox_width=20,
+            checkbox_height=20
+        )
+        self.checkbox.grid(row=0, column=0, padx=10, pady=10)
+
+        # Task info frame (contains text and due date)
+        self.info_frame = ctk.CTkFrame(self.frame, fg_color="transparent")
+        self.info_frame.grid(row=0, column=1, sticky="ew", padx=10, pady=10)
+        self.info_frame.grid_columnconfigure(0, weight=1)
+        self.info_frame.bind("<Button-1>", self.on_click)
+
+        # Task text
+        self.text_label = ctk.CTkLabel(
+            self.info_frame,
+            text="",
+            font=ctk.CTkFont(size=14),
+            wraplength=400,
+            justify="left",
+            anchor="w"
+        )
+        self.text_label.grid(row=0, column=0, sticky="w")
+        self.text_label.bind("<Button-1>", self.on_click)
+
+        # Due date, only gridded for tasks that have one
+        self.due_label = ctk.CTkLabel(
+            self.info_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color="#E67E22"  # Orange color for due dates
+        )
+
+        # Created date label
+        self.date_label = ctk.CTkLabel(
+            self.frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color="gray"
+        )
+        self.date_label.grid(row=0, column=2, padx=10, pady=10)
+        self.date_label.bind("<Button-1>", self.on_click)
+
+    def bind_task(self, task, selected=False):
+        """Show the given task in this row"""
+        self.task_id = task.id
+
+        self.check_var.set(task.completed)
+        self.text_label.configure(
+            text=task.text,
+            text_color="gray" if task.completed else ("gray10", "gray90")
+        )
+
+        rule = repeat_rule(task)
+        if rule:
+            # A recurring task shows the occurrence it is waiting on
+            due = next_due(task)
+            text = f"↻ {describe_repeat(rule)}"
+            if due and not task.completed:
+                text += f" · Next: {self.app.format_date(due)}"
+            self.due_label.configure(text=text)
+            self.due_label.grid(row=1, column=0, sticky="w", pady=(2, 0))
+        elif task.due:
+            self.due_label.configure(text=f"Due: {self.app.format_date(task.due)}")
+            self.due_label.grid(row=1, column=0, sticky="w", pady=(2, 0))
+        else:
+            self.due_label.grid_remove()
+
+        self.date_label.configure(text=self.app.format_date(task.created))
+        self.set_selected(selected)
+
+    def set_selected(self, selected):
+        self.frame.configure(fg_color=ROW_SELECTED_COLOR if selected else ROW_COLOR)
+
+    def bind_wheel(self, callback):
+        """Forward mouse wheel events on any part of the row"""
+        for widget in (self.frame, self.info_frame, self.text_label, self.due_label, self.date_label):
+            widget.bind("<MouseWheel>", callback)
+            widget.bind("<Button-4>", callback)
+            widget.bind("<Button-5>", callback)
+
+    def on_click(self, event=None):
+        if self.task_id:
+            self.app.select_task(self.task_id, event)
+
+    def on_check(self):
+        if self.task_id:
+            self.app.toggle_task(self.task_id, self.check_var.get())
+
+    def destroy(self):
+        self.frame.destroy()
+
+
+class CalendarTaskCard:
+    """The widgets that display one task under the calendar.
+
+    Cards are kept in a pool and rebound with bind_task, so moving around
+    the calendar does not create and destroy widgets.
+    """
+
+    def __init__(self, parent):
+        self.frame = ctk.CTkFrame(parent, corner_radius=8)
+
+        # Create horizontal layout
+        inner_frame = ctk.CTkFrame(self.frame, fg_color="transparent")
+        inner_frame.pack(fill="x", padx=10, pady=10)
+
+        # Task completion indicator
+        self.status_frame = ctk.CTkFrame(inner_frame, width=120, corner_radius=4)
+        self.status_frame.pack(side="left", padx=(0, 10))
+
+        self.status_label = ctk.CTkLabel(
+            self.status_frame,
+            text="",
+            font=ctk.CTkFont(size=12, weight="bold"),
+            text_color="white"
+        )
+        self.status_label.pack(padx=8, pady=4)
+
+        # Task text
+        text_container = ctk.CTkFrame(inner_frame, fg_color="transparent")
+        text_container.pack(side="left", fill="both", expand=True)
+
+        self.text_label = ctk.CTkLabel(
+            text_container,
+            text="",
+            font=ctk.CTkFont(size=14),
+            wraplength=500,
+            justify="left",
+            anchor="w"
+        )
+        self.text_label.pack(anchor="w")
+
+        # Creation date in small text below, only packed when there is one
+        self.date_label = ctk.CTkLabel(
+            text_container,
+            text="",
+            font=ctk.CTkFont(size=10),
+            text_color="gray"
+        )
+
+    def bind_task(self, task, format_date):
+        """Show the given task on this card"""
+        self.status_frame.configure(fg_color="#2ecc71" if task.completed else "#e74c3c")
+        self.status_label.configure(text="✓ Completed" if task.completed else "◯ Pending")
+        self.text_label.configure(
+            text=task.text,
+            text_color="gray" if task.completed else ("gray10", "gray90")
+        )
+        if task.created:
+            self.date_label.configure(text=f"Created: {format_date(task.created)}")
+            self.date_label.pack(anchor="w")
+        else:
+            self.date_label.pack_forget()
+
+
 class TodoApp(ctk.CTk):
     def __init__(self):
         super().__init__()
         
+        # Cold start: import, window, ui, first_paint and load, in seconds
+        self.startup_times = {
+            "import": IMPORTS_DONE - STARTUP_STARTED,
+            "window": time.perf_counter() - IMPORTS_DONE,
+        }
+        ui_started = time.perf_counter()
+        
         # Set window title and properties
         self.title("TODO App")
         self.geometry("1000x700")  # Increased width for calendar view
@@ -27,17 +307,29 @@ class TodoApp(ctk.CTk):
         self.current_time = datetime.now()
         
         # Initialize variables
-        self.tasks = []
-        self.selected_index = None
+        self.selected_index = None  # The last clicked task, shift ranges start here
+        self.selected_ids = set()  # Every selected task, for bulk actions
         self.data_file = "tasks.json"
+        self.storage_mode = STORAGE_MODE
+        self.engine = TaskEngine(self.data_file, self.storage_mode)
+        self.persistence_polling = False
+        # Coroutines run on an asyncio loop thread, started by the first
+        # run_async so startup does not pay for it
+        self.async_runner = AsyncRunner()
+        self.async_polling = False
+        self.external_checking = False
+        self.external_reading = False
+        self.reminder_after_id = None  # The one reminder timer
+        self.reminder_due = None  # Due time it is armed for
+        self.reminder_hide_id = None
+        self.io_job = None  # The running ImportJob or ExportJob
+        self.io_importing = False  # Whether io_job is an ImportJob
+        self.commit_pending = False
         self.current_filter = "All"
-        
-        # Create assets folder if it doesn't exist
-        if not os.path.exists("assets"):
-            os.makedirs("assets")
-        
-        # Load tasks from file
-        self.load_tasks()
+        self.shown_counts = None  # Task counts on the filter buttons
+        self.search_query = ""
+        self.search_after_id = None
+        self.date_format = DATE_FORMAT
         
         # Create layout
         self.create_ui()
@@ -46,6 +338,19 @@ class TodoApp(ctk.CTk):
         # Flag to track if calendar view is showing
         self.calendar_view_showing = False
         self.calendar_frame = None
+        self.calendar_markers_month = None  # (year, month) the day markers show
+        
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.bind("<Control-a>", self.select_all)
+        self.bind("<Control-z>", self.undo_change)
+        self.bind("<Control-y>", self.redo_change)
+        self.bind("<Control-Z>", self.redo_change)  # Ctrl+Shift+Z
+        
+        self.startup_times["ui"] = time.perf_counter() - ui_started
+        self.bind("<Map>", self.on_first_map, add="+")
+        
+        # Load tasks from file, a slice at a time once the window is up
+        self.start_loading()
         
     def create_ui(self):
         # Main grid configuration
@@ -116,6 +421,33 @@ class TodoApp(ctk.CTk):
         )
         self.calendar_button.grid(row=4, column=0, padx=20, pady=10, sticky="ew")
         
+        # Import and export, kept at the bottom of the sidebar's free space
+        self.io_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
+        self.io_frame.grid(row=5, column=0, padx=20, pady=10, sticky="sew")
+        self.io_frame.grid_columnconfigure((0, 1), weight=1)
+        
+        self.import_button = ctk.CTkButton(
+            self.io_frame,
+            text="Import…",
+            width=75,
+            command=self.import_tasks,
+            fg_color="transparent",
+            border_width=2,
+            text_color=("gray10", "gray90")
+        )
+        self.import_button.grid(row=0, column=0, padx=(0, 5), sticky="ew")
+        
+        self.export_button = ctk.CTkButton(
+            self.io_frame,
+            text="Export…",
+            width=75,
+            command=self.export_tasks,
+            fg_color="transparent",
+            border_width=2,
+            text_color=("gray10", "gray90")
+        )
+        self.export_button.grid(row=0, column=1, padx=(5, 0), sticky="ew")
+        
         # Appearance mode settings at bottom of sidebar
         self.appearance_label = ctk.CTkLabel(
             self.sidebar_frame, text="Appearance:", anchor="w"
@@ -127,7 +459,20 @@ class TodoApp(ctk.CTk):
             values=["System", "Light", "Dark"],
             command=self.change_appearance_mode
         )
-        self.appearance_option.grid(row=7, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.appearance_option.grid(row=7, column=0, padx=20, pady=(0, 10), sticky="ew")
+        
+        # How task dates are written, shown as an example date
+        self.date_format_label = ctk.CTkLabel(
+            self.sidebar_frame, text="Date format:", anchor="w"
+        )
+        self.date_format_label.grid(row=8, column=0, padx=20, pady=(10, 0), sticky="w")
+        
+        self.date_format_option = ctk.CTkOptionMenu(
+            self.sidebar_frame,
+            values=list(DATE_FORMAT_CHOICES),
+            command=lambda choice: self.set_date_format(DATE_FORMAT_CHOICES[choice])
+        )
+        self.date_format_option.grid(row=9, column=0, padx=20, pady=(0, 20), sticky="ew")
         
         # Main content frame - container for both task view and calendar view
         self.main_frame = ctk.CTkFrame(self, corner_radius=10)
@@ -139,7 +484,7 @@ class TodoApp(ctk.CTk):
         self.task_view_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
         self.task_view_frame.grid(row=0, column=0, sticky="nsew")
         self.task_view_frame.grid_columnconfigure(0, weight=1)
-        self.task_view_frame.grid_rowconfigure(1, weight=1)
+        self.task_view_frame.grid_rowconfigure(2, weight=1)  # Task list fills the window
         
         # Header with filter label and task entry
         self.header_frame = ctk.CTkFrame(self.task_view_frame, fg_color="transparent")
@@ -154,6 +499,25 @@ class TodoApp(ctk.CTk):
         )
         self.filter_label.grid(row=0, column=0, sticky="w")
         
+        # Progress of the initial load, hidden once all tasks are in
+        self.loading_label = ctk.CTkLabel(
+            self.header_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color="gray"
+        )
+        
+        # Search box, filters the list as you type
+        self.search_entry = ctk.CTkEntry(
+            self.header_frame,
+            placeholder_text="Search tasks...",
+            width=220,
+            height=32
+        )
+        self.search_entry.grid(row=0, column=2, sticky="e", padx=(10, 0))
+        self.search_entry.bind("<KeyRelease>", self.on_search_key)
+        self.search_entry.bind("<Escape>", self.clear_search)
+        
         # Task entry and add button
         self.entry_frame = ctk.CTkFrame(self.task_view_frame, fg_color="transparent") 
         self.entry_frame.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="new")
@@ -184,6 +548,14 @@ class TodoApp(ctk.CTk):
         )
         self.add_button.grid(row=0, column=2)
         
+        # Makes the new task a recurring one
+        self.repeat_option = ctk.CTkOptionMenu(
+            self.entry_frame,
+            values=list(REPEAT_CHOICES),
+            width=100
+        )
+        self.repeat_option.grid(row=1, column=1, padx=5, pady=(5, 0))
+        
         # Selected due date label
         self.due_date_label = ctk.CTkLabel(
             self.entry_frame,
@@ -204,7 +576,33 @@ class TodoApp(ctk.CTk):
         )
         self.task_frame.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="nsew")
         self.task_frame.grid_columnconfigure(0, weight=1)
-        
+        self.task_rows = {}
+        self.row_positions = {}
+        self.empty_label = None
+
+        # Virtual task list, used instead of task_frame for long lists
+        self.virtual_frame = ctk.CTkFrame(self.task_view_frame, fg_color="transparent", corner_radius=0)
+        self.virtual_frame.grid_columnconfigure(0, weight=1)
+        self.virtual_frame.grid_rowconfigure(0, weight=1)
+
+        self.virtual_body = ctk.CTkFrame(self.virtual_frame, fg_color="transparent", corner_radius=0)
+        self.virtual_body.grid(row=0, column=0, sticky="nsew")
+        self.virtual_body.grid_columnconfigure(0, weight=1)
+        self.virtual_body.grid_propagate(False)  # Size follows the window, not the row pool
+        self.virtual_body.bind("<Configure>", self.on_virtual_resize)
+        self.virtual_body.bind("<MouseWheel>", self.on_virtual_wheel)
+        self.virtual_body.bind("<Button-4>", self.on_virtual_wheel)
+        self.virtual_body.bind("<Button-5>", self.on_virtual_wheel)
+
+        self.virtual_scrollbar = ctk.CTkScrollbar(self.virtual_frame, command=self.on_virtual_scroll)
+        self.virtual_scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.row_pool = []
+        self.virtual_rows = {}  # task id -> pooled row currently showing it
+        self.virtual_tasks = []
+        self.virtual_top = 0
+        self.list_mode = "full"
+
         # Footer with action buttons
         self.footer_frame = ctk.CTkFrame(self.task_view_frame, fg_color="transparent")
         self.footer_frame.grid(row=3, column=0, padx=20, pady=(0, 20), sticky="ew")
@@ -235,208 +633,783 @@ class TodoApp(ctk.CTk):
         )
         self.edit_button.pack(side="right", padx=5)
         
-    def load_tasks(self):
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, "r") as f:
-                    self.tasks = json.load(f)
-            except:
-                self.tasks = []
+        # Bulk actions, shown while several tasks are selected
+        self.selection_frame = ctk.CTkFrame(self.footer_frame, fg_color="transparent")
+        self.selection_label = ctk.CTkLabel(self.selection_frame, text="", font=ctk.CTkFont(size=12))
+        self.selection_label.pack(side="left", padx=(0, 10))
+        for text, command in (
+            ("Complete", lambda: self.complete_selected(True)),
+            ("Reopen", lambda: self.complete_selected(False)),
+            ("Set Due Date", self.set_due_date_selected),
+        ):
+            ctk.CTkButton(self.selection_frame, text=text, width=90, command=command).pack(side="left", padx=5)
+        
+        # Pages archived tasks into the Completed filter, shown only there
+        self.older_button = ctk.CTkButton(
+            self.footer_frame,
+            text="Load Older Completed",
+            command=self.load_older_completed,
+            fg_color="transparent",
+            border_width=2,
+            text_color=("gray10", "gray90")
+        )
+        
+    @property
+    def tasks(self):
+        return self.engine.tasks
+    
+    def start_loading(self):
+        """Stream tasks from storage into the engine without blocking the UI"""
+        self.load_started = time.perf_counter()
+        self.engine.start_loading()
+        self.after_idle(self.load_next_slice)
+    
+    def load_next_slice(self):
+        """Read tasks for up to LOAD_SLICE_MS, show them, then yield to Tk"""
+        if not self.engine.loading:
+            return
+        
+        finished = self.engine.load_some(LOAD_SLICE_MS / 1000)
+        self.patch_task_list()
+        
+        if finished:
+            self.finish_loading()
         else:
-            self.tasks = []
+            self.loading_label.configure(text=f"Loading… {len(self.engine)} tasks")
+            self.loading_label.grid(row=0, column=1, sticky="e")
+            self.after(1, self.load_next_slice)
+    
+    def finish_loading(self):
+        self.loading_label.grid_forget()
+        print(f"Loaded {len(self.engine)} tasks")
+        if self.engine.load_error:
+            # The engine will not write the partly read list over the file
+            messagebox.showerror(
+                "Error",
+                f"Could not read all tasks from {self.data_file}:\n{self.engine.load_error}\n\n"
+                "The file will not be overwritten until it can be read."
+            )
+        if "load" not in self.startup_times:
+            self.startup_times["load"] = time.perf_counter() - self.load_started
+            self.startup_times["tasks"] = len(self.engine)
+            self.report_startup()
+        
+        # Move tasks completed long ago out of the working set
+        if self.engine.archive_completed(ARCHIVE_AFTER_DAYS):
+            self.save_tasks()
+            self.patch_task_list()
+        self.update_older_button()
+        
+        # Get the search index ready while the user is not typing yet
+        self.after_idle(self.index_next_slice)
+        self.arm_reminders()
+        
+        if not self.external_checking:
+            self.external_checking = True
+            self.after(EXTERNAL_CHECK_MS, self.poll_external_changes)
+        
+        # Tasks for the shown day may have arrived after it was drawn
+        self.calendar_markers_month = None
+        if self.calendar_view_showing and self.calendar_frame:
+            self.on_calendar_date_selected()
+            self.update_month_label()
+    
+    def index_next_slice(self):
+        """Build the search index for up to LOAD_SLICE_MS, then yield to Tk"""
+        if self.engine.loading:
+            return
+        if not self.engine.build_search_index(LOAD_SLICE_MS / 1000):
+            self.after(1, self.index_next_slice)
+    
+    def on_first_map(self, event):
+        # Children's <Map> events reach the window's bindings too
+        if event.widget is not self or "first_paint" in self.startup_times:
+            return
+        # Drawing happens in idle callbacks right after the window is mapped
+        self.after_idle(self.mark_first_paint)
+    
+    def mark_first_paint(self):
+        self.startup_times["first_paint"] = time.perf_counter() - STARTUP_STARTED
+        self.report_startup()
+    
+    def report_startup(self):
+        """Print the cold start timings once the window is drawn and tasks loaded"""
+        times = self.startup_times
+        if "first_paint" not in times or "load" not in times:
+            return
+        times["ready"] = time.perf_counter() - STARTUP_STARTED
+        print(
+            f"Startup: import {times['import']:.3f}s, window {times['window']:.3f}s, "
+            f"ui {times['ui']:.3f}s, first paint {times['first_paint']:.3f}s, "
+            f"load {times['load']:.3f}s ({times['tasks']} tasks), ready {times['ready']:.3f}s"
+        )
+        
+        if STARTUP_REPORT_FILE:
+            try:
+                with open(STARTUP_REPORT_FILE, "w") as f:
+                    json.dump(times, f, indent=2)
+            except OSError as e:
+                print(f"Error writing startup report: {e}")
+        if EXIT_AFTER_STARTUP:
+            self.after_idle(self.on_close)
     
     def save_tasks(self):
-        with open(self.data_file, "w") as f:
-            json.dump(self.tasks, f)
+        """Queue the engine's changes for writing.
+
+        Changes made while handling one event share a single commit, and
+        the persistence worker coalesces bursts into one write.
+        """
+        # The calendar's day markers are redrawn when next shown
+        self.calendar_markers_month = None
+        
+        if self.engine.snapshot_dirty and not self.commit_pending:
+            self.commit_pending = True
+            self.after_idle(self.commit_changes)
+        self.watch_persistence()
+        
+        # A change may have moved the next due task
+        self.arm_reminders()
+    
+    def arm_reminders(self):
+        """Point the reminder timer at the next task to come due"""
+        due = self.engine.next_reminder()
+        if due == self.reminder_due and self.reminder_after_id is not None:
+            return
+        if self.reminder_after_id is not None:
+            self.after_cancel(self.reminder_after_id)
+            self.reminder_after_id = None
+        self.reminder_due = due
+        if due is None:
+            return
+        delay = min(max(0, int((due - time.time()) * 1000)), REMINDER_MAX_WAIT_MS)
+        self.reminder_after_id = self.after(delay, self.fire_reminders)
+    
+    def fire_reminders(self):
+        self.reminder_after_id = None
+        self.reminder_due = None
+        tasks = self.engine.due_reminders()
+        if tasks:
+            self.show_reminder(tasks)
+        self.arm_reminders()
+    
+    def show_reminder(self, tasks):
+        """Show an in-app notification for tasks that just came due"""
+        text = tasks[0].text if len(tasks[0].text) <= 60 else tasks[0].text[:57] + "..."
+        if len(tasks) > 1:
+            text += f"\nand {len(tasks) - 1} more"
+        try:
+            # Create the notification the first time it is needed
+            if not hasattr(self, 'reminder_frame'):
+                self.reminder_frame = ctk.CTkFrame(self, fg_color="#e67e22", corner_radius=8)
+                self.reminder_label = ctk.CTkLabel(
+                    self.reminder_frame,
+                    text="",
+                    font=ctk.CTkFont(size=14, weight="bold"),
+                    text_color="white",
+                    justify="left"
+                )
+                self.reminder_label.pack(side="left", padx=(12, 6), pady=8)
+                ctk.CTkButton(
+                    self.reminder_frame,
+                    text="✕",
+                    width=28,
+                    fg_color="transparent",
+                    hover_color="#d35400",
+                    command=self.hide_reminder
+                ).pack(side="right", padx=(0, 6), pady=8)
+            
+            self.reminder_label.configure(text=f"⏰ Due now: {text}")
+            self.reminder_frame.place(relx=0.98, rely=0.02, anchor="ne")
+            self.reminder_frame.lift()
+            self.bell()
+            
+            if self.reminder_hide_id is not None:
+                self.after_cancel(self.reminder_hide_id)
+            self.reminder_hide_id = self.after(REMINDER_SHOW_MS, self.hide_reminder)
+        except Exception as e:
+            print(f"Error showing reminder: {e}")
+    
+    def hide_reminder(self):
+        if self.reminder_hide_id is not None:
+            self.after_cancel(self.reminder_hide_id)
+            self.reminder_hide_id = None
+        if hasattr(self, 'reminder_frame'):
+            self.reminder_frame.place_forget()
+    
+    def commit_changes(self):
+        if not self.engine.commit():
+            # Still loading, a snapshot now would miss tasks
+            self.after(PERSIST_POLL_MS, self.commit_changes)
+            return
+        self.commit_pending = False
+    
+    def watch_persistence(self):
+        """Poll the persistence worker's results until it goes idle"""
+        if not self.persistence_polling:
+            self.persistence_polling = True
+            self.after(PERSIST_POLL_MS, self.poll_persistence)
+    
+    def poll_persistence(self):
+        for error in self.engine.poll():
+            print(f"Error saving tasks: {error}")
+            self.flash_status_message("Could not save tasks", duration=4000)
+        
+        if self.engine.busy():
+            self.after(PERSIST_POLL_MS, self.poll_persistence)
+        else:
+            self.persistence_polling = False
+    
+    def run_async(self, coro, on_done=None, on_error=None):
+        """Run a coroutine on the asyncio loop thread.
+
+        on_done gets its result, or on_error its exception, back on the Tk
+        thread, so both may touch widgets and the engine.
+        """
+        future = self.async_runner.submit(coro, on_done, on_error or self.on_async_error)
+        if not self.async_polling:
+            self.async_polling = True
+            self.after(ASYNC_POLL_MS, self.poll_async)
+        return future
+    
+    def poll_async(self):
+        self.async_runner.poll()
+        if self.async_runner.pending():
+            self.after(ASYNC_POLL_MS, self.poll_async)
+        else:
+            self.async_polling = False
+    
+    def on_async_error(self, error):
+        print(f"Background job failed: {error!r}")
+        self.flash_status_message("Something went wrong in the background", duration=4000)
+    
+    def poll_external_changes(self):
+        # The storage is read on the asyncio thread, a big file would
+        # otherwise stall the window for the whole read
+        if not self.external_reading and self.engine.external_changes_pending():
+            self.external_reading = True
+            revision = self.engine.revision
+            self.run_async(
+                self.engine.read_external_changes(),
+                lambda fresh: self.on_external_read(fresh, revision),
+                self.on_external_read_error
+            )
+        self.after(EXTERNAL_CHECK_MS, self.poll_external_changes)
+    
+    def on_external_read(self, fresh, revision):
+        self.external_reading = False
+        self.show_external_changes(self.engine.merge_read(fresh, revision))
+    
+    def on_external_read_error(self, error):
+        self.external_reading = False
+        print(f"Error reading changed tasks: {error}")
+    
+    def merge_external_changes(self, force=False):
+        """Merge tasks another process saved, returns True if there were any"""
+        if self.external_reading:
+            # A read is already on its way
+            return False
+        return self.show_external_changes(self.engine.sync_external_changes(force))
+    
+    def show_external_changes(self, changes):
+        """Redraw the tasks merged from disk, returns True if there were any"""
+        if not changes:
+            return False
+        added, changed, removed = changes
+        if not (added or changed or removed):
+            return False
+        print(f"Tasks changed on disk: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+        
+        self.prune_selection()
+        self.calendar_markers_month = None
+        self.patch_task_list(set(added) | set(changed))
+        self.arm_reminders()
+        if self.calendar_view_showing and self.calendar_frame:
+            self.on_calendar_date_selected()
+            self.update_month_label()
+        return True
+    
+    def import_tasks(self):
+        """Import tasks from a CSV, NDJSON or iCalendar file"""
+        if self.io_job is not None or self.engine.loading:
+            messagebox.showinfo("Info", "Please wait for the tasks to finish loading")
+            return
+        path = filedialog.askopenfilename(title="Import Tasks", filetypes=IO_FILETYPES)
+        if not path:
+            return
+        from task_io import ImportJob
+        try:
+            self.io_job = ImportJob(self.engine, path)
+            self.io_importing = True
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Import Failed", str(e))
+            return
+        self.after(1, self.run_io_slice)
+    
+    def export_tasks(self):
+        """Export every task, archived ones included, to a file"""
+        if self.io_job is not None or self.engine.loading:
+            messagebox.showinfo("Info", "Please wait for the tasks to finish loading")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export Tasks",
+            defaultextension=".csv",
+            filetypes=IO_FILETYPES
+        )
+        if not path:
+            return
+        from task_io import ExportJob
+        try:
+            self.io_job = ExportJob(self.engine, path)
+            self.io_importing = False
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Export Failed", str(e))
+            return
+        self.after(1, self.run_io_slice)
+    
+    def run_io_slice(self):
+        """Import or export for up to LOAD_SLICE_MS, show progress, then yield to Tk"""
+        job = self.io_job
+        if job is None:
+            return
+        importing = self.io_importing
+        try:
+            finished = job.run_some(LOAD_SLICE_MS / 1000)
+        except Exception as e:
+            print(f"Error during {'import' if importing else 'export'}: {e}")
+            job.cancel()
+            self.io_job = None
+            self.loading_label.grid_forget()
+            messagebox.showerror("Import Failed" if importing else "Export Failed", str(e))
+            if importing:
+                self.save_tasks()
+                self.patch_task_list()
+            return
+        
+        if importing:
+            # Each batch is already on its way to the storage
+            self.watch_persistence()
+            self.patch_task_list()
+        
+        if finished:
+            self.finish_io_job(job)
+        else:
+            verb = "Importing" if importing else "Exporting"
+            self.loading_label.configure(text=f"{verb}… {job.progress():.0%}")
+            self.loading_label.grid(row=0, column=1, sticky="e")
+            self.after(1, self.run_io_slice)
+    
+    def finish_io_job(self, job):
+        self.io_job = None
+        self.loading_label.grid_forget()
+        if not self.io_importing:
+            print(f"Exported {job.written} tasks to {job.path}")
+            self.flash_status_message(f"Exported {job.written} tasks")
+            return
+        
+        print(f"Imported {job.added} tasks, skipped {job.skipped}, failed {job.failed}")
+        self.save_tasks()
+        self.patch_task_list()
+        message = f"Imported {job.added} tasks"
+        if job.skipped:
+            message += f", {job.skipped} already there"
+        if job.failed:
+            message += f", {job.failed} unreadable"
+        self.flash_status_message(message, duration=4000)
+        
+        # Also refresh calendar view if it's showing
+        if self.calendar_view_showing and hasattr(self, 'calendar_frame') and self.calendar_frame:
+            self.after(100, self.refresh_calendar_view)
+    
+    def on_close(self):
+        """Write out pending changes before the window closes"""
+        if self.io_job is not None:
+            self.io_job.cancel()
+        self.async_runner.stop()
+        self.engine.close()
+        self.destroy()
     
     def update_task_list(self):
-        # Clear current tasks in the UI
-        for widget in self.task_frame.winfo_children():
-            widget.destroy()
+        self.update_filter_counts()
         
         # Get filtered tasks
         filtered_tasks = self.get_filtered_tasks()
         
+        # Long lists only get as many row widgets as fit in the window
+        if len(filtered_tasks) > VIRTUAL_LIST_THRESHOLD:
+            self.show_virtual_list(filtered_tasks)
+        else:
+            self.show_full_list(filtered_tasks)
+    
+    def set_list_mode(self, mode):
+        """Swap the full and virtual task list containers"""
+        if mode == self.list_mode:
+            return
+        if mode == "virtual":
+            self.task_frame.grid_forget()
+            self.virtual_frame.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        else:
+            self.virtual_frame.grid_forget()
+            self.task_frame.grid(row=2, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.list_mode = mode
+    
+    def show_full_list(self, filtered_tasks):
+        """Build one row per task in the scrollable task frame"""
+        self.set_list_mode("full")
+        
+        # Clear current tasks in the UI
+        for widget in self.task_frame.winfo_children():
+            widget.destroy()
+        self.task_rows = {}
+        self.row_positions = {}
+        self.empty_label = None
+        
         # If there are no tasks, show a message
         if not filtered_tasks:
-            no_tasks_label = ctk.CTkLabel(
-                self.task_frame,
-                text=f"No {self.current_filter.lower()} tasks to display",
-                font=ctk.CTkFont(size=14),
-                text_color="gray"
-            )
-            no_tasks_label.grid(row=0, column=0, pady=20)
+            self.show_empty_message()
             return
         
         # Add tasks to the UI
         for i, task in enumerate(filtered_tasks):
-            task_id = task["id"]
-            task_frame = ctk.CTkFrame(self.task_frame, corner_radius=6, fg_color=("gray90", "gray20"))
-            task_frame.grid(row=i, column=0, sticky="ew", pady=5)
-            task_frame.grid_columnconfigure(1, weight=1)
-            
-            # Store task ID directly in the frame for easier retrieval
-            task_frame.task_id = task_id
-            
-            # Add click event to select task
-            task_frame.bind("<Button-1>", self.on_task_click)
-            
-            # Checkbox for task completion
-            check_var = tk.BooleanVar(value=task["completed"])
-            checkbox = ctk.CTkCheckBox(
-                task_frame, 
+            self.insert_task_row(task, i)
+    
+    def show_empty_message(self):
+        if self.empty_label is None:
+            self.empty_label = ctk.CTkLabel(
+                self.task_frame,
                 text="",
-                variable=check_var,
-                command=lambda tid=task_id, var=check_var: self.toggle_task(tid, var.get()),
-                width=20,
-                checkbox_width=20,
-                checkbox_height=20
-            )
-            checkbox.grid(row=0, column=0, padx=10, pady=10)
-            
-            # Task info frame (contains text and due date)
-            task_info_frame = ctk.CTkFrame(task_frame, fg_color="transparent")
-            task_info_frame.grid(row=0, column=1, sticky="ew", padx=10, pady=10)
-            task_info_frame.grid_columnconfigure(0, weight=1)
-            
-            # Also bind the click event to the task info frame and store task ID
-            task_info_frame.task_id = task_id
-            task_info_frame.bind("<Button-1>", self.on_task_click)
-            
-            # Task text
-            task_text = ctk.CTkLabel(
-                task_info_frame, 
-                text=task["text"],
                 font=ctk.CTkFont(size=14),
-                wraplength=400,
-                justify="left",
-                anchor="w"
-            )
-            if task["completed"]:
-                task_text.configure(text_color="gray")
-            task_text.grid(row=0, column=0, sticky="w")
-            
-            # Bind click event to the task text label as well and store task ID
-            task_text.task_id = task_id
-            task_text.bind("<Button-1>", self.on_task_click)
-            
-            # Due date (if present)
-            if task.get("due_date"):
-                due_date_str = self.format_date(task["due_date"])
-                due_date_label = ctk.CTkLabel(
-                    task_info_frame,
-                    text=f"Due: {due_date_str}",
-                    font=ctk.CTkFont(size=12),
-                    text_color="#E67E22"  # Orange color for due dates
-                )
-                due_date_label.grid(row=1, column=0, sticky="w", pady=(2, 0))
-            
-            # Created date label
-            date_text = self.format_date(task["date"])
-            date_label = ctk.CTkLabel(
-                task_frame, 
-                text=date_text,
-                font=ctk.CTkFont(size=12),
                 text_color="gray"
             )
-            date_label.grid(row=0, column=2, padx=10, pady=10)
-            
-    def format_date(self, date_str):
-        try:
-            date = datetime.fromisoformat(date_str)
-            return date.strftime("%b %d, %Y")
-        except:
+        if self.search_query.strip():
+            self.empty_label.configure(text=f"No {self.current_filter.lower()} tasks match \"{self.search_query.strip()}\"")
+        else:
+            self.empty_label.configure(text=f"No {self.current_filter.lower()} tasks to display")
+        self.empty_label.grid(row=0, column=0, pady=20)
+    
+    def insert_task_row(self, task, position):
+        row = TaskRow(self, self.task_frame)
+        row.frame.grid(row=position, column=0, sticky="ew", pady=5)
+        row.bind_task(task, selected=task.id in self.selected_ids)
+        self.task_rows[task.id] = row
+        self.row_positions[task.id] = position
+    
+    def remove_task_row(self, task_id):
+        row = self.task_rows.pop(task_id, None)
+        self.row_positions.pop(task_id, None)
+        if row:
+            row.destroy()
+    
+    def patch_task_list(self, changed_ids=()):
+        """Bring the visible rows in line with self.tasks after a change.
+
+        Unlike update_task_list this keeps existing row widgets: it only
+        removes rows that left the filter, creates rows that joined it,
+        rebinds the rows in changed_ids and re-grids rows that moved.
+        """
+        self.update_filter_counts()
+        filtered_tasks = self.get_filtered_tasks()
+        
+        if len(filtered_tasks) > VIRTUAL_LIST_THRESHOLD:
+            if self.list_mode == "virtual":
+                self.virtual_tasks = filtered_tasks
+                self.render_virtual_rows(changed_ids)
+            else:
+                self.show_virtual_list(filtered_tasks)
+            return
+        
+        if self.list_mode == "virtual":
+            # Dropped back under the threshold
+            self.show_full_list(filtered_tasks)
+            return
+        
+        # Remove rows for tasks that were deleted or left the filter
+        shown_ids = {task.id for task in filtered_tasks}
+        for task_id in [tid for tid in self.task_rows if tid not in shown_ids]:
+            self.remove_task_row(task_id)
+        
+        if not filtered_tasks:
+            self.show_empty_message()
+            return
+        if self.empty_label is not None:
+            self.empty_label.grid_forget()
+        
+        for position, task in enumerate(filtered_tasks):
+            row = self.task_rows.get(task.id)
+            if row is None:
+                self.insert_task_row(task, position)
+                continue
+            if task.id in changed_ids:
+                row.bind_task(task, selected=task.id in self.selected_ids)
+            if self.row_positions[task.id] != position:
+                row.frame.grid(row=position, column=0, sticky="ew", pady=5)
+                self.row_positions[task.id] = position
+    
+    def show_virtual_list(self, filtered_tasks):
+        """Show a long list through the pool of virtual rows"""
+        self.set_list_mode("virtual")
+        self.virtual_tasks = filtered_tasks
+        self.render_virtual_rows()
+    
+    def virtual_visible_count(self):
+        """Number of rows that fit in the virtual list viewport"""
+        height = self.virtual_body.winfo_height()
+        if height <= 1:
+            # Not laid out yet, the <Configure> handler will render again
+            height = 600
+        return height // (VIRTUAL_ROW_HEIGHT + 2 * VIRTUAL_ROW_PADDING) + 1
+    
+    def render_virtual_rows(self, changed_ids=None):
+        """Rebind the row pool to the slice of tasks scrolled into view.
+
+        With changed_ids, rows already showing the right task are only
+        rebound if that task is in changed_ids.
+        """
+        visible = self.virtual_visible_count()
+        total = len(self.virtual_tasks)
+        
+        # Grow the pool to fill the viewport, never past it
+        while len(self.row_pool) < visible:
+            row = TaskRow(self, self.virtual_body, fixed_height=VIRTUAL_ROW_HEIGHT)
+            row.frame.grid(row=len(self.row_pool), column=0, sticky="ew", pady=VIRTUAL_ROW_PADDING)
+            row.bind_wheel(self.on_virtual_wheel)
+            self.row_pool.append(row)
+        
+        # Keep the window inside the list
+        self.virtual_top = max(0, min(self.virtual_top, total - visible + 1))
+        
+        self.virtual_rows = {}
+        for i, row in enumerate(self.row_pool):
+            index = self.virtual_top + i
+            if i < visible and index < total:
+                task = self.virtual_tasks[index]
+                if changed_ids is None or row.task_id != task.id or task.id in changed_ids:
+                    row.bind_task(task, selected=task.id in self.selected_ids)
+                row.frame.grid()
+                self.virtual_rows[task.id] = row
+            else:
+                row.task_id = None
+                row.frame.grid_remove()
+        
+        # Scrollbar covers the full list, not just the pooled rows
+        if total:
+            first = self.virtual_top / total
+            last = min(1.0, (self.virtual_top + visible) / total)
+            self.virtual_scrollbar.set(first, last)
+        else:
+            self.virtual_scrollbar.set(0, 1)
+    
+    def row_for_task(self, task_id):
+        """Return the row currently showing a task, or None if it is not shown"""
+        if self.list_mode == "virtual":
+            return self.virtual_rows.get(task_id)
+        return self.task_rows.get(task_id)
+    
+    def scroll_virtual_list(self, top):
+        if self.list_mode != "virtual":
+            return
+        top = max(0, top)
+        if top != self.virtual_top:
+            self.virtual_top = top
+            self.render_virtual_rows()
+    
+    def on_virtual_scroll(self, action, amount, unit=None):
+        """Scrollbar command for the virtual list"""
+        if action == "moveto":
+            self.scroll_virtual_list(int(float(amount) * len(self.virtual_tasks)))
+        elif action == "scroll":
+            step = int(amount)
+            if unit == "pages":
+                step *= max(1, self.virtual_visible_count() - 1)
+            self.scroll_virtual_list(self.virtual_top + step)
+    
+    def on_virtual_wheel(self, event):
+        """Scroll the virtual list three rows per wheel notch"""
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_virtual_list(self.virtual_top - 3)
+        else:
+            self.scroll_virtual_list(self.virtual_top + 3)
+    
+    def on_virtual_resize(self, event=None):
+        if self.list_mode == "virtual":
+            self.render_virtual_rows()
+            
+    def format_date(self, date):
+        if isinstance(date, str):
+            date = parse_iso(date)
+        if date is None:
             return ""
+        if isinstance(date, datetime):
+            date = date.date()
+        return format_day(date, self.date_format)
+    
+    def set_date_format(self, date_format):
+        """Change how task dates are shown and redraw the list"""
+        self.date_format = date_format
+        self.refresh_dates()
+    
+    def refresh_dates(self):
+        """Drop cached date strings and redraw, e.g. after a locale change"""
+        invalidate_date_cache()
+        self.update_task_list()
+        if self.calendar_view_showing and self.calendar_frame:
+            self.refresh_calendar_view()
             
     def add_task(self):
         text = self.task_entry.get().strip()
         if text:
-            task = {
-                "id": self.generate_id(),
-                "text": text,
-                "completed": False,
-                "date": self.current_time.isoformat(),
-                "due_date": self.selected_due_date
-            }
-            self.tasks.append(task)
+            task = self.engine.add_task(
+                text,
+                due=parse_iso(self.selected_due_date),
+                created=self.current_time,
+                repeat=REPEAT_CHOICES.get(self.repeat_option.get())
+            )
             self.save_tasks()
             self.task_entry.delete(0, "end")
             
-            # Reset due date
+            # Reset due date and repeat
             self.selected_due_date = None
             self.due_date_label.configure(text="No due date selected")
+            self.repeat_option.set("Does not repeat")
             
-            self.update_task_list()
+            self.patch_task_list({task.id})
             
             # Also refresh calendar view if it's showing
             if self.calendar_view_showing and hasattr(self, 'calendar_frame') and self.calendar_frame:
                 # Use after to avoid refreshing in the middle of widget operations
                 self.after(100, self.refresh_calendar_view)
     
-    def generate_id(self):
-        # Use our application's current_time to ensure consistency
-        return self.current_time.strftime("%Y%m%d%H%M%S%f")
-    
     def toggle_task(self, task_id, completed):
-        for task in self.tasks:
-            if task["id"] == task_id:
-                task["completed"] = completed
-                self.save_tasks()
-                self.update_task_list()
-                
-                # Also refresh calendar view if it's showing
-                if self.calendar_view_showing and hasattr(self, 'calendar_frame') and self.calendar_frame:
-                    # Use after to avoid refreshing in the middle of widget operations
-                    self.after(100, self.refresh_calendar_view)
-                break
+        task = self.engine.toggle_task(task_id, completed)
+        if task:
+            self.save_tasks()
+            self.patch_task_list({task_id})
+            if completed and repeat_rule(task) and not task.completed:
+                # The series stays open, waiting on its next occurrence
+                self.flash_status_message(f"Next: {self.format_date(next_due(task))}")
+            
+            # Also refresh calendar view if it's showing
+            if self.calendar_view_showing and hasattr(self, 'calendar_frame') and self.calendar_frame:
+                # Use after to avoid refreshing in the middle of widget operations
+                self.after(100, self.refresh_calendar_view)
     
-    def on_task_click(self, event):
-        """Handle click on any part of a task"""
-        # Get the widget that was clicked
-        widget = event.widget
-        
-        # Get task ID from the widget or its parent
-        task_id = getattr(widget, 'task_id', None)
+    def select_task(self, task_id, event=None):
+        """Select a task and highlight it.
+
+        Ctrl-click adds or removes a task from the selection, shift-click
+        selects the range from the last clicked task in the shown list.
+        """
+        state = getattr(event, "state", 0) if event is not None else 0
+        control = state & CONTROL_MASK
+        
+        if state & SHIFT_MASK and self.selected_index is not None:
+            shown_ids = [task.id for task in self.get_filtered_tasks()]
+            try:
+                start = shown_ids.index(self.selected_index)
+                end = shown_ids.index(task_id)
+            except ValueError:
+                start = end = None
+            if start is not None:
+                if start > end:
+                    start, end = end, start
+                selected = set(shown_ids[start:end + 1])
+                if control:
+                    selected |= self.selected_ids
+                # The range keeps its start as the anchor for the next shift-click
+                self.set_selection(selected, self.selected_index)
+                return
         
-        # If widget doesn't have task_id, try to get it from parent
-        if task_id is None and hasattr(widget, 'master'):
-            task_id = getattr(widget.master, 'task_id', None)
+        if control:
+            selected = set(self.selected_ids)
+            if task_id in selected:
+                selected.discard(task_id)
+            else:
+                selected.add(task_id)
+            self.set_selection(selected, task_id)
+        else:
+            self.set_selection({task_id}, task_id)
         
-        # If we found a task ID, select the task
-        if task_id:
-            self.select_task(task_id)
+        print(f"Selected task with ID: {task_id}")  # Debug output
     
-    def select_task(self, task_id):
-        """Select a task and highlight it"""
-        self.selected_index = task_id
-        
-        # Reset all frames to default color
-        for widget in self.task_frame.winfo_children():
-            if isinstance(widget, ctk.CTkFrame):
-                widget.configure(fg_color=("gray90", "gray20"))
-                
-                # If this is the selected task, highlight it
-                if hasattr(widget, 'task_id') and widget.task_id == task_id:
-                    widget.configure(fg_color=("gray75", "gray30"))
+    def select_all(self, event=None):
+        """Select every task in the current filter and search"""
+        # Leave Ctrl+A to text entries when one has focus
+        if isinstance(self.focus_get(), (tk.Entry, tk.Text)):
+            return None
+        if self.calendar_view_showing:
+            return None
+        tasks = self.get_filtered_tasks()
+        self.set_selection({task.id for task in tasks}, tasks[0].id if tasks else None)
+        return "break"
+    
+    def set_selection(self, selected_ids, anchor=None):
+        """Replace the selection, repainting only the rows that changed"""
+        for task_id in self.selected_ids ^ selected_ids:
+            row = self.row_for_task(task_id)
+            if row:
+                row.set_selected(task_id in selected_ids)
+        self.selected_ids = selected_ids
+        self.selected_index = anchor if anchor in selected_ids else next(iter(selected_ids), None)
+        self.update_selection_bar()
+    
+    def prune_selection(self):
+        """Drop tasks that no longer exist from the selection"""
+        selected = {task_id for task_id in self.selected_ids if self.engine.get(task_id) is not None}
+        if selected != self.selected_ids:
+            self.set_selection(selected, self.selected_index)
+    
+    def prune_hidden_selection(self):
+        """Drop tasks hidden by the current filter or search from the selection"""
+        # Bulk actions must only touch tasks the user can see
+        if not self.selected_ids:
+            return
+        shown = {task.id for task in self.get_filtered_tasks()}
+        selected = self.selected_ids & shown
+        if selected != self.selected_ids:
+            self.set_selection(selected, self.selected_index)
+    
+    def update_selection_bar(self):
+        """Show the bulk actions while more than one task is selected"""
+        count = len(self.selected_ids)
+        if count > 1:
+            self.selection_label.configure(text=f"{count} selected")
+            self.selection_frame.pack(side="left")
+        else:
+            self.selection_frame.pack_forget()
+    
+    def after_bulk_change(self, changed_ids=()):
+        """Save and redraw once after a batch of changes"""
+        self.save_tasks()
+        self.prune_selection()
+        self.patch_task_list(set(changed_ids))
         
-        print(f"Selected task with ID: {task_id}")  # Debug output
+        # Also refresh calendar view if it's showing
+        if self.calendar_view_showing and hasattr(self, 'calendar_frame') and self.calendar_frame:
+            # Use after to avoid refreshing in the middle of widget operations
+            self.after(100, self.refresh_calendar_view)
+    
+    def complete_selected(self, completed=True):
+        changed = self.engine.set_completed(self.selected_ids, completed)
+        if changed:
+            self.after_bulk_change(task.id for task in changed)
+    
+    def set_due_date_selected(self):
+        """Pick one due date for every selected task"""
+        def apply_due_date(due_date):
+            changed = self.engine.update_tasks(self.selected_ids, {"due_date": due_date}, "Set due date")
+            if changed:
+                self.after_bulk_change(task.id for task in changed)
+        self.select_due_date(on_pick=apply_due_date)
     
     def delete_task(self):
-        if self.selected_index:
-            for i, task in enumerate(self.tasks):
-                if task["id"] == self.selected_index:
-                    del self.tasks[i]
-                    self.selected_index = None
-                    self.save_tasks()
-                    self.update_task_list()
-                    
-                    # Also refresh calendar view if it's showing
-                    if self.calendar_view_showing and hasattr(self, 'calendar_frame') and self.calendar_frame:
-                        # Use after to avoid refreshing in the middle of widget operations
-                        self.after(100, self.refresh_calendar_view)
-                    break
-        else:
+        if not self.selected_ids:
             messagebox.showinfo("Info", "Please select a task to delete")
+            return
+        count = len(self.selected_ids)
+        if count > 1 and not messagebox.askyesno("Delete Tasks", f"Delete {count} selected tasks?"):
+            return
+        if self.engine.delete_tasks(self.selected_ids):
+            self.after_bulk_change()
+            self.flash_status_message("Deleted - Ctrl+Z to undo")
     
     def edit_task(self):
         if not self.selected_index:
@@ -444,11 +1417,7 @@ class TodoApp(ctk.CTk):
             return
             
         # Find the selected task
-        selected_task = None
-        for task in self.tasks:
-            if task["id"] == self.selected_index:
-                selected_task = task
-                break
+        selected_task = self.engine.get(self.selected_index)
                 
         if not selected_task:
             messagebox.showinfo("Error", "Selected task not found")
@@ -469,7 +1438,7 @@ class TodoApp(ctk.CTk):
         
         task_entry = ctk.CTkEntry(edit_window, width=360)
         task_entry.grid(row=1, column=0, padx=20, pady=(5, 10), sticky="ew")
-        task_entry.insert(0, selected_task["text"])
+        task_entry.insert(0, selected_task.text)
         
         # Due date section
         due_date_label = ctk.CTkLabel(edit_window, text="Due Date:")
@@ -481,20 +1450,15 @@ class TodoApp(ctk.CTk):
         due_date_frame.grid_columnconfigure(0, weight=1)
         
         # Format and display current due date
-        if selected_task.get("due_date"):
-            try:
-                due_date = datetime.fromisoformat(selected_task["due_date"])
-                due_date_text = due_date.strftime("%B %d, %Y")
-                text_color = "#E67E22"  # Orange for due dates
-            except:
-                due_date_text = "No due date"
-                text_color = ("gray10", "gray90")
+        if selected_task.due:
+            due_date_text = selected_task.due.strftime("%B %d, %Y")
+            text_color = "#E67E22"  # Orange for due dates
         else:
             due_date_text = "No due date"
             text_color = ("gray10", "gray90")
         
         # Due date display
-        self.edit_due_date_value = selected_task.get("due_date")  # Store the current value
+        self.edit_due_date_value = selected_task.due.isoformat() if selected_task.due else None  # Store the current value
         self.edit_due_date_display = ctk.CTkLabel(
             due_date_frame, 
             text=due_date_text,
@@ -541,10 +1505,13 @@ class TodoApp(ctk.CTk):
         def save_edit():
             new_text = task_entry.get().strip()
             if new_text:
-                selected_task["text"] = new_text
-                selected_task["due_date"] = self.edit_due_date_value  # Update due date
+                changes = {
+                    "text": new_text,
+                    "due_date": self.edit_due_date_value  # Update due date
+                }
+                self.engine.update_task(selected_task.id, changes)
                 self.save_tasks()
-                self.update_task_list()
+                self.patch_task_list({selected_task.id})
                 
                 # Also refresh calendar view if it's showing
                 if self.calendar_view_showing and hasattr(self, 'calendar_frame') and self.calendar_frame:
@@ -606,6 +1573,7 @@ class TodoApp(ctk.CTk):
         
         # Calendar widget with default date if exists
         current_date = datetime.now()
+        from tkcalendar import Calendar  # Imported on first use, see the imports at the top
         cal = Calendar(
             due_date_window, 
             selectmode='day',
@@ -721,14 +1689,46 @@ class TodoApp(ctk.CTk):
         )
     
     def clear_completed(self):
-        self.tasks = [task for task in self.tasks if not task["completed"]]
+        removed = self.engine.clear_completed()
+        self.prune_selection()
         self.save_tasks()
-        self.update_task_list()
+        self.patch_task_list()
+        if removed:
+            self.flash_status_message(f"Cleared {len(removed)} tasks - Ctrl+Z to undo")
+    
+    def undo_change(self, event=None):
+        """Take back the last change to the tasks (Ctrl+Z)"""
+        # Text entries keep their own undo
+        if isinstance(self.focus_get(), (tk.Entry, tk.Text)):
+            return None
+        result = self.engine.undo()
+        if result is None:
+            self.flash_status_message("Nothing to undo")
+        else:
+            label, task_ids = result
+            self.after_bulk_change(task_ids)
+            self.flash_status_message(f"Undid: {label}")
+        return "break"
+    
+    def redo_change(self, event=None):
+        """Do the last undone change again (Ctrl+Y or Ctrl+Shift+Z)"""
+        if isinstance(self.focus_get(), (tk.Entry, tk.Text)):
+            return None
+        result = self.engine.redo()
+        if result is None:
+            self.flash_status_message("Nothing to redo")
+        else:
+            label, task_ids = result
+            self.after_bulk_change(task_ids)
+            self.flash_status_message(f"Redid: {label}")
+        return "break"
     
     def filter_tasks(self, filter_type):
         self.current_filter = filter_type
         self.filter_label.configure(text=f"{filter_type} Tasks")
-        self.update_task_list()
+        self.virtual_top = 0
+        self.prune_hidden_selection()
+        self.patch_task_list()
         
         # Update sidebar button styling
         self.filter_all.configure(fg_color="transparent")
@@ -741,21 +1741,65 @@ class TodoApp(ctk.CTk):
             self.filter_active.configure(fg_color=("gray75", "gray25"))
         elif filter_type == "Completed":
             self.filter_completed.configure(fg_color=("gray75", "gray25"))
+        self.update_older_button()
+    
+    def update_older_button(self):
+        if self.current_filter == "Completed" and self.engine.archive.has_older():
+            self.older_button.pack(side="left", padx=5)
+        else:
+            self.older_button.pack_forget()
+    
+    def load_older_completed(self):
+        """Show the next month of archived tasks at the end of the Completed list"""
+        count = self.engine.page_older_completed()
+        self.patch_task_list()
+        self.update_older_button()
+        self.flash_status_message(f"Loaded {count} archived tasks")
     
     def get_filtered_tasks(self):
-        if self.current_filter == "All":
-            return self.tasks
-        elif self.current_filter == "Active":
-            return [task for task in self.tasks if not task["completed"]]
-        elif self.current_filter == "Completed":
-            return [task for task in self.tasks if task["completed"]]
-        return self.tasks
+        if self.search_query.strip():
+            return self.engine.search(self.search_query, self.current_filter)
+        return self.engine.filtered(self.current_filter)
+    
+    def on_search_key(self, event=None):
+        """Run the search once typing pauses"""
+        if self.search_after_id is not None:
+            self.after_cancel(self.search_after_id)
+        self.search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.run_search)
+    
+    def run_search(self):
+        self.search_after_id = None
+        query = self.search_entry.get()
+        if query == self.search_query:
+            return
+        self.search_query = query
+        self.virtual_top = 0
+        self.prune_hidden_selection()
+        self.patch_task_list()
+    
+    def clear_search(self, event=None):
+        self.search_entry.delete(0, "end")
+        self.on_search_key()
+    
+    def update_filter_counts(self):
+        """Show the number of tasks in each filter on the sidebar buttons"""
+        counts = self.engine.counts()
+        if counts == self.shown_counts:
+            return
+        self.filter_all.configure(text=f"All Tasks ({counts['All']})")
+        self.filter_active.configure(text=f"Active Tasks ({counts['Active']})")
+        self.filter_completed.configure(text=f"Completed Tasks ({counts['Completed']})")
+        self.shown_counts = counts
         
     def change_appearance_mode(self, new_appearance_mode):
         ctk.set_appearance_mode(new_appearance_mode)
 
-    def select_due_date(self):
-        """Open a calendar dialog to select a due date"""
+    def select_due_date(self, on_pick=None):
+        """Open a calendar dialog to select a due date.
+
+        The date is used for the next new task, or passed to on_pick as an
+        ISO string (None when cleared) if given.
+        """
         due_date_window = ctk.CTkToplevel(self)
         due_date_window.title("Select Due Date")
         due_date_window.geometry("350x450")  # Increased height for buttons
@@ -790,6 +1834,7 @@ class TodoApp(ctk.CTk):
         
         # Calendar widget
         current_date = datetime.now()
+        from tkcalendar import Calendar
         cal = Calendar(
             due_date_window, 
             selectmode='day',
@@ -846,9 +1891,12 @@ class TodoApp(ctk.CTk):
         
         # Clear button
         def clear_date():
+            due_date_window.destroy()
+            if on_pick:
+                on_pick(None)
+                return
             self.selected_due_date = None
             self.due_date_label.configure(text="No due date selected")
-            due_date_window.destroy()
         
         clear_button = ctk.CTkButton(
             buttons_frame,
@@ -876,18 +1924,25 @@ class TodoApp(ctk.CTk):
         def confirm_date():
             try:
                 selected_date = cal.selection_get()
-                self.selected_due_date = datetime(
+                due_date = datetime(
                     selected_date.year,
                     selected_date.month,
                     selected_date.day
                 ).isoformat()
-                self.due_date_label.configure(
-                    text=f"Due date: {selected_date.strftime('%b %d, %Y')}",
-                    text_color="#E67E22"  # Orange color
-                )
-                due_date_window.destroy()
-            except:
+            except (AttributeError, ValueError):
+                # selection_get gives None until a day is picked
                 messagebox.showwarning("Warning", "Please select a date first")
+                return
+            if on_pick:
+                due_date_window.destroy()
+                on_pick(due_date)
+                return
+            self.selected_due_date = due_date
+            self.due_date_label.configure(
+                text=f"Due date: {selected_date.strftime('%b %d, %Y')}",
+                text_color="#E67E22"  # Orange color
+            )
+            due_date_window.destroy()
         
         confirm_button = ctk.CTkButton(
             buttons_frame,
@@ -925,6 +1980,8 @@ class TodoApp(ctk.CTk):
             # If the calendar frame already exists, just show it
             if self.calendar_frame:
                 self.calendar_frame.grid(row=0, column=0, sticky="nsew")
+                # Tasks may have changed while it was hidden
+                self.update_month_label()
                 return
             
             # Create a new calendar frame in the main window
@@ -974,7 +2031,16 @@ class TodoApp(ctk.CTk):
                 font=ctk.CTkFont(size=20, weight="bold"),
                 text_color="white"
             )
-            self.month_label.pack(pady=15)
+            self.month_label.pack(pady=(15, 0))
+            
+            # Task counts for the displayed month
+            self.month_summary_label = ctk.CTkLabel(
+                month_box,
+                text="",
+                font=ctk.CTkFont(size=12),
+                text_color="white"
+            )
+            self.month_summary_label.pack(pady=(0, 10))
             
             # Navigation buttons
             nav_frame = ctk.CTkFrame(sidebar, fg_color="transparent")
@@ -1059,11 +2125,8 @@ class TodoApp(ctk.CTk):
             self.calendar_month = system_month
             self.calendar_day = system_day
             
-            # Set month display correctly
-            current_month = datetime(system_year, system_month, 1).strftime("%B %Y")
-            self.month_label.configure(text=current_month)
-            
             # Create Calendar widget - ensure the month matches our stored month
+            from tkcalendar import Calendar
             self.calendar_widget = Calendar(
                 cal_frame, 
                 selectmode='day',
@@ -1077,8 +2140,17 @@ class TodoApp(ctk.CTk):
             )
             self.calendar_widget.pack(fill="both", expand=True, padx=15, pady=15)
             
-            # Bind date selection event
+            # Bind date selection event, and follow the calendar's own month arrows
             self.calendar_widget.bind("<<CalendarSelected>>", self.on_calendar_date_selected)
+            self.calendar_widget.bind("<<CalendarMonthChanged>>", self.on_calendar_month_changed)
+            
+            # Day markers: tasks still to do, overdue, or all done
+            self.calendar_widget.tag_config("due", background="#3498db", foreground="white")
+            self.calendar_widget.tag_config("overdue", background="#e74c3c", foreground="white")
+            self.calendar_widget.tag_config("done", background="#2ecc71", foreground="white")
+            
+            # Set month display correctly
+            self.update_month_label()
             
             # Tasks for selected date
             tasks_frame = ctk.CTkFrame(self.calendar_frame, corner_radius=10)
@@ -1105,6 +2177,16 @@ class TodoApp(ctk.CTk):
             )
             self.calendar_tasks_frame.pack(fill="x", padx=10, pady=10, expand=False)
             
+            # Task cards are reused from day to day, the pool only grows
+            self.calendar_cards = []
+            self.calendar_cards_shown = 0
+            self.no_calendar_tasks_label = ctk.CTkLabel(
+                self.calendar_tasks_frame, 
+                text="No tasks for this date",
+                font=ctk.CTkFont(size=14),
+                text_color="gray"
+            )
+            
             # Show tasks for the current date
             self.show_calendar_tasks(datetime(system_year, system_month, system_day))
             
@@ -1128,117 +2210,19 @@ class TodoApp(ctk.CTk):
                 new_month = 12
                 new_year -= 1
             
-            # Update internal tracking
-            self.calendar_month = new_month
-            self.calendar_year = new_year
-            
-            # Create a date object for the 1st of the new month
+            # Select the 1st of the new month, which also shows the month
             first_day = datetime(new_year, new_month, 1)
+            self.show_calendar_day(first_day)
             
-            # Update the month label in the sidebar
-            month_name = first_day.strftime("%B %Y")
-            self.month_label.configure(text=month_name)
-            
-            # Set a date in the new month to force calendar to update
-            self.calendar_widget.selection_set(first_day)
-            
-            # Simplest approach - remove and recreate the calendar
-            try:
-                # Store the parent frame
-                parent_frame = self.calendar_widget.master
-                
-                # Save style settings
-                style_settings = {
-                    'selectbackground': self.calendar_widget.cget('selectbackground'),
-                    'selectforeground': self.calendar_widget.cget('selectforeground'),
-                    'headersbackground': self.calendar_widget.cget('headersbackground'),
-                    'headersforeground': self.calendar_widget.cget('headersforeground')
-                }
-                
-                # Remove the old calendar
-                self.calendar_widget.destroy()
-                
-                # Create a new calendar with the new month/year
-                self.calendar_widget = Calendar(
-                    parent_frame, 
-                    selectmode='day',
-                    year=new_year,
-                    month=new_month,
-                    day=1,
-                    showweeknumbers=False,
-                    firstweekday='sunday',
-                    font=('Helvetica', 11),
-                    **style_settings
-                )
-                self.calendar_widget.pack(fill="both", expand=True, padx=15, pady=15)
-                
-                # Rebind the date selection event
-                self.calendar_widget.bind("<<CalendarSelected>>", self.on_calendar_date_selected)
-                
-                # Update task display
-                self.show_calendar_tasks(first_day)
-            except Exception as e:
-                print(f"Error recreating calendar: {e}")
-            
-            print(f"Calendar navigated to {month_name}")
+            print(f"Calendar navigated to {self.month_label.cget('text')}")
         except Exception as e:
             print(f"Error changing calendar month: {e}")
     
     def calendar_go_to_today(self):
         """Set the calendar to today's date"""
         try:
-            # Force today to be May 5, 2025
-            system_year = self.current_time.year
-            system_month = self.current_time.month  # Use Month 5 (May) for today
-            system_day = self.current_time.day  # Explicitly set to 5th
-            
-            today = datetime(system_year, system_month, system_day)
-            
-            # Update internal tracking
-            self.calendar_year = system_year
-            self.calendar_month = system_month
-            self.calendar_day = system_day
-            
-            # Update the month label
-            month_name = today.strftime("%B %Y")
-            self.month_label.configure(text=month_name)
-            
-            # Store the parent frame
-            parent_frame = self.calendar_widget.master
-            
-            # Save style settings
-            style_settings = {
-                'selectbackground': self.calendar_widget.cget('selectbackground'),
-                'selectforeground': self.calendar_widget.cget('selectforeground'),
-                'headersbackground': self.calendar_widget.cget('headersbackground'),
-                'headersforeground': self.calendar_widget.cget('headersforeground')
-            }
-            
-            # Remove the old calendar
-            self.calendar_widget.destroy()
-            
-            # Create a new calendar with today's date
-            self.calendar_widget = Calendar(
-                parent_frame, 
-                selectmode='day',
-                year=system_year,
-                month=system_month,
-                day=system_day,
-                showweeknumbers=False,
-                firstweekday='sunday',
-                font=('Helvetica', 11),
-                **style_settings
-            )
-            self.calendar_widget.pack(fill="both", expand=True, padx=15, pady=15)
-            
-            # Rebind the date selection event
-            self.calendar_widget.bind("<<CalendarSelected>>", self.on_calendar_date_selected)
-            
-            # Set the selection to today
-            self.calendar_widget.selection_set(today)
-            
-            # Update task display
-            self.show_calendar_tasks(today)
+            today = datetime(self.current_time.year, self.current_time.month, self.current_time.day)
+            self.show_calendar_day(today)
             
             print(f"Calendar set to today: {today.strftime('%Y-%m-%d')}")
         except Exception as e:
@@ -1247,6 +2231,70 @@ class TodoApp(ctk.CTk):
             import traceback
             traceback.print_exc()
     
+    def show_calendar_day(self, date):
+        """Select a date in the calendar, moving it to that month in place"""
+        # Update internal tracking first, so the <<CalendarMonthChanged>> this
+        # may raise finds the month already handled
+        self.calendar_year = date.year
+        self.calendar_month = date.month
+        self.calendar_day = date.day
+        
+        # The same Calendar is kept for the life of the view; selection_set
+        # redraws its day cells for the new month without new widgets
+        self.calendar_widget.selection_set(date)
+        self.calendar_widget.see(date)
+        
+        self.update_month_label()
+        self.show_calendar_tasks(date)
+    
+    def on_calendar_month_changed(self, event=None):
+        """Keep the sidebar in step when the calendar's own arrows change month"""
+        try:
+            month, year = self.calendar_widget.get_displayed_month()
+        except Exception as e:
+            print(f"Error reading calendar month: {e}")
+            return
+        if (year, month) == (self.calendar_year, self.calendar_month):
+            return
+        self.calendar_year = year
+        self.calendar_month = month
+        self.update_month_label()
+    
+    def update_month_label(self):
+        """Show the displayed month and its task counts in the calendar sidebar"""
+        first_day = datetime(self.calendar_year, self.calendar_month, 1).date()
+        self.month_label.configure(text=format_day(first_day, "%B %Y"))
+        self.update_month_summary()
+        self.update_calendar_markers()
+    
+    def update_calendar_markers(self):
+        """Mark the days of the displayed month that have tasks due.
+
+        Only the visible month is marked, from the engine's per-day counts,
+        so this costs the same however many tasks there are. Markers are
+        redrawn when the month changes or after calendar_markers_month is
+        reset by a change to the tasks.
+        """
+        month = (self.calendar_year, self.calendar_month)
+        if month == self.calendar_markers_month:
+            return
+        try:
+            self.calendar_widget.calevent_remove("all")
+            today = datetime.now().date()
+            for day, stats in self.engine.day_summaries(*month).items():
+                if stats["completed"] == stats["total"]:
+                    tag = "done"
+                elif day < today:
+                    tag = "overdue"
+                else:
+                    tag = "due"
+                self.calendar_widget.calevent_create(
+                    day, f"{stats['total']} due · {stats['completed']} done", tag
+                )
+            self.calendar_markers_month = month
+        except Exception as e:
+            print(f"Error marking calendar days: {e}")
+    
     def on_calendar_date_selected(self, event=None):
         """Handle date selection in the calendar"""
         try:
@@ -1263,103 +2311,46 @@ class TodoApp(ctk.CTk):
     def show_calendar_tasks(self, date):
         """Show tasks for the selected date in the calendar view"""
         try:
-            # Clear current tasks
-            for widget in self.calendar_tasks_frame.winfo_children():
-                widget.destroy()
-            
             # Update the header
-            date_str = date.strftime("%A, %B %d, %Y")
+            day = date.date() if isinstance(date, datetime) else date
+            date_str = format_day(day, "%A, %B %d, %Y")
             self.selected_date_label.configure(text=f"Tasks for {date_str}")
             
-            # Get tasks for this date
-            date_str_iso = date.strftime("%Y-%m-%d")
-            date_tasks = []
-            
-            for task in self.tasks:
-                if "due_date" in task and task["due_date"]:
-                    # Extract date part (YYYY-MM-DD)
-                    task_date = task["due_date"].split("T")[0] if "T" in task["due_date"] else task["due_date"][:10]
-                    if task_date == date_str_iso:
-                        date_tasks.append(task)
+            # Get tasks for this date from the due date index
+            date_tasks = self.engine.tasks_on_day(day)
             
             # If no tasks, show a message
-            if not date_tasks:
-                no_tasks_label = ctk.CTkLabel(
-                    self.calendar_tasks_frame, 
-                    text="No tasks for this date",
-                    font=ctk.CTkFont(size=14),
-                    text_color="gray"
-                )
-                no_tasks_label.pack(pady=20)
-                return
+            if date_tasks:
+                self.no_calendar_tasks_label.pack_forget()
+            else:
+                self.no_calendar_tasks_label.pack(pady=20)
+            
+            # Bind the day's tasks to pooled cards. The shown cards are always
+            # the first ones, so packing more keeps them in order
+            while len(self.calendar_cards) < len(date_tasks):
+                self.calendar_cards.append(CalendarTaskCard(self.calendar_tasks_frame))
+            for i, task in enumerate(date_tasks):
+                card = self.calendar_cards[i]
+                card.bind_task(task, self.format_date)
+                if i >= self.calendar_cards_shown:
+                    card.frame.pack(fill="x", pady=5, padx=5)
+            for card in self.calendar_cards[len(date_tasks):self.calendar_cards_shown]:
+                card.frame.pack_forget()
+            self.calendar_cards_shown = len(date_tasks)
             
-            # Display tasks
-            for task in date_tasks:
-                task_frame = ctk.CTkFrame(
-                    self.calendar_tasks_frame, 
-                    corner_radius=8
-                )
-                task_frame.pack(fill="x", pady=5, padx=5)
-                
-                # Create horizontal layout
-                task_inner_frame = ctk.CTkFrame(task_frame, fg_color="transparent")
-                task_inner_frame.pack(fill="x", padx=10, pady=10)
-                
-                # Task completion indicator
-                status_color = "#2ecc71" if task["completed"] else "#e74c3c"
-                status_text = "✓ Completed" if task["completed"] else "◯ Pending"
-                status_frame = ctk.CTkFrame(
-                    task_inner_frame, 
-                    width=120,
-                    corner_radius=4, 
-                    fg_color=status_color
-                )
-                status_frame.pack(side="left", padx=(0, 10))
-                
-                status_label = ctk.CTkLabel(
-                    status_frame,
-                    text=status_text,
-                    font=ctk.CTkFont(size=12, weight="bold"),
-                    text_color="white"
-                )
-                status_label.pack(padx=8, pady=4)
-                
-                # Task text
-                text_container = ctk.CTkFrame(task_inner_frame, fg_color="transparent")
-                text_container.pack(side="left", fill="both", expand=True)
-                
-                task_text = ctk.CTkLabel(
-                    text_container, 
-                    text=task["text"],
-                    font=ctk.CTkFont(size=14),
-                    wraplength=500,
-                    justify="left",
-                    anchor="w"
-                )
-                if task["completed"]:
-                    task_text.configure(text_color="gray")
-                task_text.pack(anchor="w")
-                
-                # Creation date in small text below
-                if "date" in task:
-                    try:
-                        creation_date = datetime.fromisoformat(task["date"])
-                        creation_text = f"Created: {creation_date.strftime('%b %d, %Y')}"
-                        
-                        date_label = ctk.CTkLabel(
-                            text_container,
-                            text=creation_text,
-                            font=ctk.CTkFont(size=10),
-                            text_color="gray"
-                        )
-                        date_label.pack(anchor="w")
-                    except:
-                        pass
-                        
             print(f"Showing {len(date_tasks)} tasks for {date_str}")
         except Exception as e:
             print(f"Error showing calendar tasks: {e}")
 
+    def update_month_summary(self):
+        """Show the task counts of the displayed month in the calendar sidebar"""
+        summary = self.engine.month_summary(self.calendar_year, self.calendar_month)
+        if summary["total"]:
+            text = f"{summary['total']} due · {summary['completed']} done"
+        else:
+            text = "Nothing due"
+        self.month_summary_label.configure(text=text)
+
     def refresh_calendar_view(self):
         """Refresh the calendar view to show updated task status"""
         try:
@@ -1374,11 +2365,14 @@ class TodoApp(ctk.CTk):
                 # If no date is selected, use the current calendar date
                 selected_date = datetime(self.calendar_year, self.calendar_month, self.calendar_day)
                 
-            # Reload tasks from file to ensure we have latest data
-            self.load_tasks()
+            # Pick up tasks saved by other processes; the file is only read
+            # if it changed since we last read or wrote it
+            self.merge_external_changes(force=True)
                 
             # Update the tasks display for the selected date
+            self.calendar_markers_month = None
             self.show_calendar_tasks(selected_date)
+            self.update_month_label()
             
             # Show a brief confirmation
             self.flash_status_message("Tasks refreshed")